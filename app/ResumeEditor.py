@@ -1,136 +1,14 @@
+import hashlib
+import json
+import os
 from typing import List
-import subprocess, os
 from utils import format_latex_string
+from latex_compiler import compile_latex, precompiled_format
+from metrics import metrics
 
-class Resume:
-    def __init__(self, education: List[dict], experience: List[dict], projects: List[dict], skills: dict, name: str, phone: str, email: str, linkedin: str, github: str):
-        self.education = education
-        self.experience = experience
-        self.projects = projects
-        self.skills = skills
-        self.name = name
-        self.phone = phone
-        self.email = email
-        self.linkedin = linkedin
-        self.github = github
-
-    def get_education_entry(self, edu: dict) -> str:
-        tex = rf"""
-        \resumeSubheading
-        {{{format_latex_string(edu["institution"])}}}{{{format_latex_string(edu["duration"])}}}
-        {{{format_latex_string(edu["degree"])}}}{{GPA: {format_latex_string(edu["grade"])}}}
-        """
-        return tex
-
-    def get_experience_entry(self, exp: dict) -> str:
-        tex = rf"""
-        \resumeSubheading
-        {{{format_latex_string(exp["organization"])}}}{{{format_latex_string(exp["duration"])}}}
-        {{{format_latex_string(exp["role"])}}}{{{format_latex_string(exp["location"])}}}
-            \resumeItemListStart
-        """
-        for point in exp["description"]:
-            tex += rf"""
-            \resumeItem{{{format_latex_string(point)}}}
-            """
-        tex += r"""
-            \resumeItemListEnd
-        """
-        return tex
-    
-    def get_project_entry(self, proj: dict) -> str:
-        tex = rf"""
-        \resumeProjectHeading
-        {{\textbf{{{format_latex_string(proj["name"])}}} $|$ \emph{{{", ".join(format_latex_string(tech) for tech in proj["technologies"])}}}}}{{}}
-            \resumeItemListStart
-        """
-        for point in proj["description"]:
-            tex += rf"""
-            \resumeItem{{{format_latex_string(point)}}}
-            """
-        tex += r"""
-            \resumeItemListEnd
-        """
-        return tex
-    
-    def generate_heading(self) -> str:
-        tex = rf"""
-        %----------HEADING----------%
-        \begin{{center}}
-            \textbf{{\Huge \scshape {self.name}}} \\ \vspace{{1pt}}
-            \seticon{{faPhone}} \ \small {self.phone} \quad
-            \href{{mailto:{format_latex_string(self.email)}}}{{\seticon{{faEnvelope}} \underline{{{format_latex_string(self.email)}}}}} \quad
-            \href{{https://www.linkedin.com/in/{format_latex_string(self.linkedin)}}}{{\seticon{{faLinkedin}} \underline{{linkedin.com/in/{format_latex_string(self.linkedin)}}}}} \quad
-            \href{{https://github.com/{format_latex_string(self.github)}}}{{\seticon{{faGithub}} \underline{{github.com/{format_latex_string(self.github)}}}}}
-        \end{{center}}
-        """
-        return tex
-    
-    def generate_education_section(self) -> str:
-        tex = rf"""
-        %-----------EDUCATION-----------%
-        \section{{Education}}
-            \resumeSubHeadingListStart
-        """
-        education_entries = []
-        for edu in self.education:
-            education_entries.append(self.get_education_entry(edu))
-        tex += "\n".join(education_entries)
-        tex += r"""
-            \resumeSubHeadingListEnd
-        """
-        return tex
-
-    def generate_experience_section(self) -> str:
-        tex = rf"""
-        %-----------EXPERIENCE-----------%
-        \section{{Experience}}
-            \resumeSubHeadingListStart
-        """
-        experience_entries = []
-        for exp in self.experience:
-            experience_entries.append(self.get_experience_entry(exp))
-        tex += "\n".join(experience_entries)
-        tex += r"""
-            \resumeSubHeadingListEnd
-        """
-        return tex
-
-    def generate_projects_section(self) -> str:
-        tex = rf"""
-        %-----------PROJECTS-----------%
-        \section{{Projects}}
-            \resumeSubHeadingListStart
-        """
-        project_entries = []
-        for proj in self.projects:
-            project_entries.append(self.get_project_entry(proj))
-        tex += "\n".join(project_entries)
-        tex += r"""
-            \resumeSubHeadingListEnd
-        """
-        return tex
-
-    def generate_skills_section(self) -> str:
-        tex = rf"""
-        %-----------SKILLS-----------%
-        \section{{Skills}}
-            \begin{{itemize}}[leftmargin=0.15in, label={{}}]
-            \small{{\item{{
-        """
-        # Assuming skills is a dictionary with categories as keys and list of skills as values
-        for category, skills_list in self.skills.items():
-            tex += rf"""
-            \textbf{{{format_latex_string(category)}}}{{{": " + ", ".join(format_latex_string(skill) for skill in skills_list)}}}
-            """
-        tex += r"""
-            }}
-            \end{itemize}
-        """
-        return tex
-
-    def generate_full_resume_latex(self) -> str:
-        tex = r"""
+# Everything before \begin{document}. It is identical for every resume, so it is dumped once into a
+# precompiled pdflatex format (see latex_compiler.precompiled_format); keep per-resume content out of it.
+RESUME_PREAMBLE = r"""
         %-------------------------
         % Resume in Latex
         % Author : Audric Serador
@@ -188,7 +66,6 @@ class Resume:
 
         %-------------------------%
         % Custom commands
-        \begin{document}
         \newcommand{\resumeItem}[1]{
         \item\small{
             {#1 \vspace{-2pt}}
@@ -229,35 +106,212 @@ class Resume:
         \definecolor{Black}{RGB}{0, 0, 0}
         \newcommand{\seticon}[1]{\textcolor{Black}{\csname #1\endcsname}}
 
+        """
+
+# Bump when the LaTeX produced by the generate_* methods changes, so cached PDFs are not reused.
+TEMPLATE_VERSION = "1"
+
+# "latex" compiles generate_full_resume_latex with pdflatex; "reportlab" lays the same sections out
+# in-process (see pdf_renderer) and needs no TeX installation.
+RENDERERS = ("latex", "reportlab")
+
+
+# Fixed pieces of the document body. Whitespace is part of the output (and so of the PDF cache key):
+# bump TEMPLATE_VERSION when changing any of these or the generate_* templates.
+_DOCUMENT_START = r"""
+        \begin{document}
+
         %-------------------------------------------%
         %%%%%%  RESUME STARTS HERE  %%%%%
         """
-        tex += self.generate_heading()
-        tex += self.generate_education_section()
-        tex += self.generate_experience_section()
-        tex += self.generate_projects_section()
-        tex += self.generate_skills_section()
-        tex += r"""
+_DOCUMENT_END = r"""
         \end{document}
         """
+_ITEM_LIST_END = r"""
+            \resumeItemListEnd
+        """
+_SECTION_END = r"""
+            \resumeSubHeadingListEnd
+        """
+
+
+def _section(marker: str, title: str, entries: str) -> str:
+    return "".join((rf"""
+        %-----------{marker}-----------%
+        \section{{{title}}}
+            \resumeSubHeadingListStart
+        """, entries, _SECTION_END))
+
+
+def default_renderer() -> str:
+    renderer = os.getenv("RESUME_RENDERER", "latex")
+    return renderer if renderer in RENDERERS else "latex"
+
+
+class Resume:
+    def __init__(self, education: List[dict], experience: List[dict], projects: List[dict], skills: dict, name: str, phone: str, email: str, linkedin: str, github: str,
+                 section_cache: dict = None):
+        self.education = education
+        self.experience = experience
+        self.projects = projects
+        self.skills = skills
+        self.name = name
+        self.phone = phone
+        self.email = email
+        self.linkedin = linkedin
+        self.github = github
+        # rendered heading/education/skills LaTeX, shared by the resumes of a batch (see _static)
+        self.section_cache = section_cache
+
+    def content_hash(self, renderer: str = "latex") -> str:
+        """Stable hash of every field plus the template version and renderer; equal hashes render identical PDFs."""
+        payload = json.dumps({
+            "template": TEMPLATE_VERSION,
+            "preamble": RESUME_PREAMBLE,
+            "renderer": renderer,
+            "fields": [self.education, self.experience, self.projects, self.skills,
+                       self.name, self.phone, self.email, self.linkedin, self.github]
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _items(points) -> str:
+        parts = [rf"""
+            \resumeItem{{{format_latex_string(point)}}}
+            """ for point in points]
+        parts.append(_ITEM_LIST_END)
+        return "".join(parts)
+
+    def get_education_entry(self, edu: dict) -> str:
+        tex = rf"""
+        \resumeSubheading
+        {{{format_latex_string(edu["institution"])}}}{{{format_latex_string(edu["duration"])}}}
+        {{{format_latex_string(edu["degree"])}}}{{GPA: {format_latex_string(edu["grade"])}}}
+        """
+        return tex
+
+    def get_experience_entry(self, exp: dict) -> str:
+        tex = rf"""
+        \resumeSubheading
+        {{{format_latex_string(exp["organization"])}}}{{{format_latex_string(exp["duration"])}}}
+        {{{format_latex_string(exp["role"])}}}{{{format_latex_string(exp["location"])}}}
+            \resumeItemListStart
+        """
+        return tex + self._items(exp["description"])
+    
+    def get_project_entry(self, proj: dict) -> str:
+        tex = rf"""
+        \resumeProjectHeading
+        {{\textbf{{{format_latex_string(proj["name"])}}} $|$ \emph{{{", ".join(format_latex_string(tech) for tech in proj["technologies"])}}}}}{{}}
+            \resumeItemListStart
+        """
+        return tex + self._items(proj["description"])
+    
+    def generate_heading(self) -> str:
+        return self._static(("heading", self.name, self.phone, self.email, self.linkedin, self.github),
+                            self._render_heading)
+
+    def _render_heading(self) -> str:
+        tex = rf"""
+        %----------HEADING----------%
+        \begin{{center}}
+            \textbf{{\Huge \scshape {self.name}}} \\ \vspace{{1pt}}
+            \seticon{{faPhone}} \ \small {self.phone} \quad
+            \href{{mailto:{format_latex_string(self.email)}}}{{\seticon{{faEnvelope}} \underline{{{format_latex_string(self.email)}}}}} \quad
+            \href{{https://www.linkedin.com/in/{format_latex_string(self.linkedin)}}}{{\seticon{{faLinkedin}} \underline{{linkedin.com/in/{format_latex_string(self.linkedin)}}}}} \quad
+            \href{{https://github.com/{format_latex_string(self.github)}}}{{\seticon{{faGithub}} \underline{{github.com/{format_latex_string(self.github)}}}}}
+        \end{{center}}
+        """
         return tex
+    
+    def generate_education_section(self) -> str:
+        return self._static(("education", json.dumps(self.education)), self._render_education_section)
+
+    def _render_education_section(self) -> str:
+        return _section("EDUCATION", "Education", "\n".join([self.get_education_entry(edu) for edu in self.education]))
 
-    def generate_full_resume_pdf(self, output_path: str) -> str:
-        tex = self.generate_full_resume_latex()
-        with open("resume.tex", "w") as f:
-            f.write(tex)
-
-        if not os.path.exists("pdfs"):
-            os.makedirs("pdfs")
-        subprocess.run(["pdflatex", f"--jobname={output_path.split('.')[0]}", "-output-directory=pdfs", "resume.tex"], stderr=subprocess.DEVNULL)
-        os.remove("resume.tex")
-        import glob
-        for pattern in ["pdfs/*.aux", "pdfs/*.log", "pdfs/*.out"]:
-            for filepath in glob.glob(pattern):
-                try:
-                    os.remove(filepath)
-                except OSError:
-                    pass
+    def generate_experience_section(self) -> str:
+        return _section("EXPERIENCE", "Experience", "\n".join([self.get_experience_entry(exp) for exp in self.experience]))
+
+    def generate_projects_section(self) -> str:
+        return _section("PROJECTS", "Projects", "\n".join([self.get_project_entry(proj) for proj in self.projects]))
+
+    def generate_skills_section(self) -> str:
+        return self._static(("skills", json.dumps(self.skills)), self._render_skills_section)
+
+    def _render_skills_section(self) -> str:
+        parts = [rf"""
+        %-----------SKILLS-----------%
+        \section{{Skills}}
+            \begin{{itemize}}[leftmargin=0.15in, label={{}}]
+            \small{{\item{{
+        """]
+        # Assuming skills is a dictionary with categories as keys and list of skills as values
+        for category, skills_list in self.skills.items():
+            parts.append(rf"""
+            \textbf{{{format_latex_string(category)}}}{{{": " + ", ".join(format_latex_string(skill) for skill in skills_list)}}}
+            """)
+        parts.append(r"""
+            }}
+            \end{itemize}
+        """)
+        return "".join(parts)
+
+    def write_full_resume_latex(self, write):
+        """Stream the LaTeX document to `write` (a file's write, a list's append) one section at a time."""
+        write(RESUME_PREAMBLE)
+        write(_DOCUMENT_START)
+        write(self.generate_heading())
+        write(self.generate_education_section())
+        write(self.generate_experience_section())
+        write(self.generate_projects_section())
+        write(self.generate_skills_section())
+        write(_DOCUMENT_END)
+
+    def generate_full_resume_latex(self) -> str:
+        parts = []
+        self.write_full_resume_latex(parts.append)
+        return "".join(parts)
+
+    def _static(self, key, render) -> str:
+        """
+        Heading, education and skills are the same for every resume of a batch: render them once per cache.
+        `key` holds the section's input fields, so resumes that differ there never share an entry.
+        """
+        if self.section_cache is None:
+            return render()
+        tex = self.section_cache.get(key)
+        if tex is None:
+            tex = self.section_cache[key] = render()
+        return tex
+
+    def generate_full_resume_pdf(self, output_path: str, output_dir: str = "pdfs", timeout: int = 60, compiler=None, use_format: bool = True,
+                                 renderer: str = "latex") -> str:
+        """
+        Render the resume to `output_dir/output_path` and return the PDF path.
+        `renderer` is one of RENDERERS; the options below only apply to "latex".
+        Pass a LatexCompilerPool as `compiler` to share a bounded pool of pdflatex workers.
+        With `use_format` the static preamble is loaded from a precompiled format instead of being
+        re-processed (falls back to a cold compile if the format cannot be built or no longer loads).
+        Raises RuntimeError if compilation fails or times out.
+        """
+        if renderer == "reportlab":
+            from pdf_renderer import render_resume_pdf
+            with metrics.stage("render.reportlab"):
+                return render_resume_pdf(self, output_path, output_dir)
+        if renderer != "latex":
+            raise ValueError(f"Unknown renderer {renderer!r}; expected one of {RENDERERS}")
+        with metrics.stage("render.pdf"):
+            fmt = precompiled_format(RESUME_PREAMBLE) if use_format else None
+            # the document is streamed straight into the compile's .tex file
+            tex = self.write_full_resume_latex
+            if compiler is not None:
+                result = compiler.submit(tex, output_path, fmt=fmt).result()
+            else:
+                result = compile_latex(tex, output_path, output_dir=output_dir, timeout=timeout, fmt=fmt)
+            if not result["ok"]:
+                raise RuntimeError(f"Resume PDF generation failed: {result['error']}")
+            return result["path"]
 
 
 if __name__ == "__main__":
@@ -1,39 +1,318 @@
+import json
 import os
-from langchain_groq import ChatGroq
+import threading
+import time
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.exceptions import OutputParserException
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from json_output import JobPostings, ResumeSelection, failed_generation, parse_json
+from llm_cache import default_cache
+from metrics import metrics
+from resume_context import CompactResume
+from utils import call_with_backoff, split_text, stream_with_backoff
 
 load_dotenv()
 
+_USE_DEFAULT_CACHE = object()
+
+# Pages longer than this (in approximate tokens) are extracted chunk by chunk.
+MAX_CHUNK_TOKENS = 4000
+
+# A broken JSON answer is sent back for one fix-up call, cut to this many characters.
+MAX_FIX_CHARS = 8000
+
+FIX_JSON_PROMPT = PromptTemplate.from_template(
+    """
+    ### INVALID JSON:
+    {output}
+    ### ERROR:
+    {error}
+    ### INSTRUCTION:
+    The text above was meant to be a single JSON value matching this JSON schema:
+    {schema}
+    Fix it and return only the corrected JSON, without commentary or code fences.
+    ### VALID JSON (NO PREAMBLE):
+    """
+)
+
+
+def _job_signature(job):
+    role = " ".join(str(job.get("role", "")).lower().split())
+    description = " ".join(str(job.get("description", "")).lower().split())[:300]
+    return role, description
+
+
+def merge_jobs(jobs, threshold=0.85):
+    """
+    De-duplicate postings extracted from overlapping chunks. Two postings are the same when their
+    roles match and their descriptions are at least `threshold` similar (or one is missing); the
+    merged posting keeps the longer description and the union of both skill lists.
+    """
+    merged = []
+    for job in jobs:
+        if not isinstance(job, dict) or not job.get("role"):
+            continue
+        role, description = _job_signature(job)
+        for kept in merged:
+            kept_role, kept_description = _job_signature(kept)
+            if kept_role != role:
+                continue
+            if description and kept_description and \
+                    SequenceMatcher(None, description, kept_description).ratio() < threshold:
+                continue
+            if len(str(job.get("description", ""))) > len(str(kept.get("description", ""))):
+                kept["description"] = job["description"]
+            if not kept.get("experience") and job.get("experience"):
+                kept["experience"] = job["experience"]
+            skills = kept.get("skills") or []
+            skills = [skills] if isinstance(skills, str) else list(skills)
+            new_skills = job.get("skills") or []
+            new_skills = [new_skills] if isinstance(new_skills, str) else new_skills
+            kept["skills"] = list(dict.fromkeys(skills + list(new_skills)))
+            break
+        else:
+            merged.append(dict(job))
+    return merged
+
+
+def _groq_backend(model_name, temperature):
+    from langchain_groq import ChatGroq
+    return ChatGroq(temperature=temperature, groq_api_key=os.getenv("GROQ_API_KEY"), model_name=model_name)
+
+
+def _fake_backend(model_name, temperature):
+    from fake_llm import FakeChatModel
+    return FakeChatModel.from_env()
+
+
+# chat model factories, called with (model_name, temperature)
+BACKENDS = {"groq": _groq_backend, "fake": _fake_backend}
+
+# request arguments that switch a backend's model to JSON output; backends missing here get plain prompts
+JSON_MODE_ARGS = {"groq": {"response_format": {"type": "json_object"}},
+                  "fake": {"response_format": {"type": "json_object"}}}
+
+
 class Chain:
-    def __init__(self):
-        self.llm = ChatGroq(temperature=0, groq_api_key=os.getenv("GROQ_API_KEY"), model_name="llama-3.1-8b-instant")
+    def __init__(self, model_name="llama-3.1-8b-instant", temperature=0, cache=_USE_DEFAULT_CACHE, backend=None,
+                 json_mode=None):
+        """
+        `cache` is an LLMCache for completions; by default one is opened on disk (see llm_cache.default_cache).
+        Pass cache=None to always call the model.
+        `backend` names the chat model in BACKENDS; defaults to $LLM_BACKEND or "groq". "fake" runs offline
+        (see fake_llm.FakeChatModel).
+        `json_mode` puts the model in JSON output mode for the extraction calls (see JSON_MODE_ARGS);
+        defaults to $LLM_JSON_MODE, on unless set to 0.
+        """
+        self.model_name = model_name
+        self.temperature = temperature
+        self.backend = backend or os.getenv("LLM_BACKEND", "groq")
+        if json_mode is None:
+            json_mode = os.getenv("LLM_JSON_MODE", "1").lower() not in ("0", "false", "no")
+        self.json_mode = json_mode
+        self._llm = None
+        self.cache = default_cache() if cache is _USE_DEFAULT_CACHE else cache
+        self._usage_lock = threading.Lock()
+        self.usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+    @property
+    def llm(self):
+        # the chat model is built on first use, so a Chain that only serves cached completions never needs it
+        if self._llm is None:
+            self._llm = BACKENDS[self.backend](self.model_name, self.temperature)
+        return self._llm
+
+    @llm.setter
+    def llm(self, value):
+        self._llm = value
+
+    @property
+    def json_llm(self):
+        """The chat model with JSON output mode bound, or the plain model if that is off or unsupported."""
+        args = JSON_MODE_ARGS.get(self.backend) if self.json_mode else None
+        return self.llm.bind(**args) if args else self.llm
+
+    def _cache_key(self, prompt, inputs):
+        # completions of different backends must not be served for each other
+        model = self.model_name if self.backend == "groq" else f"{self.backend}/{self.model_name}"
+        return self.cache.key(model, self.temperature, prompt.template, inputs)
+
+    def _record_usage(self, message, name):
+        """Count one model call and the tokens the provider reported for it."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["input_tokens"] += usage.get("input_tokens", 0)
+            self.usage["output_tokens"] += usage.get("output_tokens", 0)
+        metrics.incr("llm_tokens", usage.get("input_tokens", 0), call=name, kind="prompt")
+        metrics.incr("llm_tokens", usage.get("output_tokens", 0), call=name, kind="completion")
+
+    def _cached(self, prompt, inputs, name):
+        """(cache key, cached completion or None); the key is None when caching is off."""
+        if self.cache is None:
+            return None, None
+        key = self._cache_key(prompt, inputs)
+        cached = self.cache.get(key)
+        metrics.incr("llm_cache", call=name, result="miss" if cached is None else "hit")
+        return key, cached
+
+    def _invoke(self, prompt, inputs, parse=None, name="llm", llm=None, cache_as=None):
+        """
+        Run `prompt | llm` and return the completion text, or `parse(text)` if a parser is given.
+        Completions are served from / stored in the cache; a completion that fails `parse` is not stored,
+        so a bad response is retried on the next call instead of being replayed. With `cache_as`, the
+        cache stores `cache_as(parsed result)` instead of the raw completion.
+        `name` labels the call in the metrics (stage "llm.<name>"); `llm` overrides the chat model.
+        """
+        key, cached = self._cached(prompt, inputs, name)
+        if cached is not None:
+            return parse(cached) if parse else cached
+        with metrics.stage(f"llm.{name}"):
+            message = (prompt | (llm or self.llm)).invoke(inputs)
+        self._record_usage(message, name)
+        content = message.content
+        result = parse(content) if parse else content
+        if key is not None:
+            self.cache.set(key, cache_as(result) if cache_as else content)
+        return result
+
+    @staticmethod
+    def _json_parser(schema, name):
+        def parse(text):
+            value, repaired = parse_json(text, schema)
+            # the cache holds the repaired JSON, so this only counts answers straight from the model
+            if repaired:
+                metrics.incr("llm_json_repairs", call=name)
+            return value
+        return parse
+
+    def _invoke_parsed(self, prompt, inputs, parse, name):
+        """
+        _invoke in JSON mode. An answer the provider refused as invalid JSON (see failed_generation) is
+        parsed from the error instead, and cached like any other answer once it parses.
+        """
+        try:
+            return self._invoke(prompt, inputs, parse=parse, name=name, llm=self.json_llm, cache_as=json.dumps)
+        except OutputParserException:
+            raise
+        except Exception as e:
+            output = failed_generation(e)
+            if output is None:
+                raise
+        metrics.incr("llm_json_rejected", call=name)
+        value = parse(output)
+        if self.cache is not None:
+            self.cache.set(self._cache_key(prompt, inputs), json.dumps(value))
+        return value
 
-    def extract_jobs(self, cleaned_text):
+    def _invoke_json(self, prompt, inputs, schema, name):
+        """
+        _invoke for a JSON answer, validated against the pydantic model `schema` and returned as a dict.
+        The model runs in JSON mode when available. Near-valid JSON (code fences, prose around it,
+        trailing commas) is repaired locally, including answers the provider rejected in JSON mode; an
+        answer that still fails is sent back on its own, with the validation error and the schema, for
+        one fix-up call instead of re-running the whole prompt. Answers are cached as the validated
+        JSON, and a fixed answer is cached for the original prompt. Raises OutputParserException if
+        the fix-up fails too; only then is it counted in llm_parse_errors.
+        """
+        parse = self._json_parser(schema, name)
+        try:
+            return self._invoke_parsed(prompt, inputs, parse, name)
+        except OutputParserException as e:
+            if not e.llm_output:
+                metrics.incr("llm_parse_errors", call=name)
+                raise
+            output, error = e.llm_output, str(e).splitlines()[0]
+        metrics.incr("llm_json_fixes", call=name)
+        try:
+            fixed = self._invoke_parsed(FIX_JSON_PROMPT, {
+                "output": output[:MAX_FIX_CHARS],
+                "error": error,
+                "schema": json.dumps(schema.model_json_schema())
+            }, parse, f"{name}.fix")
+        except OutputParserException:
+            metrics.incr("llm_parse_errors", call=name)
+            raise
+        if self.cache is not None:
+            self.cache.set(self._cache_key(prompt, inputs), json.dumps(fixed))
+        return fixed
+
+    def _extract_jobs_from_text(self, text):
         prompt_extract = PromptTemplate.from_template(
             """
             ### SCRAPED TEXT FROM WEBSITE:
             {page_data}
             ### INSTRUCTION:
             The scraped text is from the career's page of a website.
-            Your job is to extract the job postings and return them in JSON format containing the following keys: `role`, `experience`, `skills` and `description`.
+            Your job is to extract the job postings and return them in JSON format as {{"jobs": [...]}}, each posting containing the following keys: `role`, `experience`, `skills` and `description`.
             Only return the valid JSON.
             ### VALID JSON (NO PREAMBLE):
             """
         )
-        chain_extract = prompt_extract | self.llm
-        res = chain_extract.invoke(input={"page_data": cleaned_text})
+        return self._invoke_json(prompt_extract, {"page_data": text}, JobPostings, name="extract_jobs")["jobs"]
+
+    def extract_jobs(self, cleaned_text, max_chunk_tokens=MAX_CHUNK_TOKENS, overlap_tokens=200, max_workers=4):
+        """
+        Extract job postings from a cleaned careers page.
+        Pages over `max_chunk_tokens` are split into overlapping chunks that are extracted in parallel;
+        the postings are then merged and de-duplicated (see merge_jobs). A chunk whose response cannot
+        be parsed even after repair and a fix-up call (see _invoke_json) is skipped, and the call only
+        fails if no chunk could be parsed. Rate-limit errors are retried with backoff, whether the page
+        is extracted in one call or chunk by chunk.
+        """
+        chunks = split_text(cleaned_text, max_chunk_tokens, overlap_tokens)
+        if len(chunks) <= 1:
+            try:
+                return call_with_backoff(self._extract_jobs_from_text, cleaned_text)
+            except OutputParserException:
+                raise OutputParserException("Context too big. Unable to parse jobs.")
+
+        def extract_chunk(chunk):
+            try:
+                return call_with_backoff(self._extract_jobs_from_text, chunk)
+            except OutputParserException:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(extract_chunk, chunks))
+        if all(r is None for r in results):
+            raise OutputParserException(f"Unable to parse jobs from any of the {len(chunks)} page chunks.")
+        return merge_jobs([job for r in results if r for job in r])
+
+    def _stream(self, prompt, inputs, name="llm"):
+        """
+        Like _invoke, but yields the completion in pieces as the model produces them.
+        A cached completion is yielded in one piece; a streamed one is cached once it is complete.
+        Besides stage "llm.<name>", the time to the first piece is recorded as "llm.<name>.first_token".
+        """
+        key, cached = self._cached(prompt, inputs, name)
+        if cached is not None:
+            yield cached
+            return
+        pieces = []
+        message = None
+        started = time.perf_counter()
         try:
-            json_parser = JsonOutputParser()
-            res = json_parser.parse(res.content)
-        except OutputParserException:
-            raise OutputParserException("Context too big. Unable to parse jobs.")
-        return res if isinstance(res, list) else [res]
+            for chunk in (prompt | self.llm).stream(inputs):
+                if message is None:
+                    metrics.observe(f"llm.{name}.first_token", time.perf_counter() - started)
+                message = chunk if message is None else message + chunk
+                if chunk.content:
+                    pieces.append(chunk.content)
+                    yield chunk.content
+        except Exception:
+            metrics.observe(f"llm.{name}", time.perf_counter() - started, error=True)
+            raise
+        metrics.observe(f"llm.{name}", time.perf_counter() - started)
+        self._record_usage(message, name)
+        if key is not None:
+            self.cache.set(key, "".join(pieces))
 
-    def write_mail(self, job, links):
-        prompt_email = PromptTemplate.from_template(
+    @staticmethod
+    def _mail_prompt():
+        return PromptTemplate.from_template(
             """
             ### JOB DESCRIPTION:
             {job_description}
@@ -52,14 +331,23 @@ class Chain:
 
             """
         )
-        chain_email = prompt_email | self.llm
-        res = chain_email.invoke({"job_description": str(job), "link_list": links})
-        return res.content
+
+    def write_mail(self, job, links):
+        return self._invoke(self._mail_prompt(), {"job_description": str(job), "link_list": links}, name="write_mail")
+
+    def stream_mail(self, job, links, limiter=None):
+        """
+        write_mail, yielded piece by piece as the model streams it. A rate-limit error before the first
+        piece is retried with backoff; pass a shared RateLimiter as `limiter` to pause every stream using
+        it when one of them hits the limit.
+        """
+        return stream_with_backoff(self._stream, self._mail_prompt(), {"job_description": str(job), "link_list": links},
+                                   name="write_mail", limiter=limiter)
     
     def write_mail_for_candidate(self, candidate_name, company, role, links):
         """
         Generate a personalised cold email for a candidate (using candidate/company/role)
-        `links` should be a list of portfolio link metadata (as returned by Portfolio.query_links).
+        `links` should be a list of portfolio links (as returned by Portfolio.query_links).
         """
         prompt_email = PromptTemplate.from_template(
             """
@@ -74,15 +362,13 @@ class Chain:
             Do NOT provide any preamble, only the email content.
             """
         )
-        chain_email = prompt_email | self.llm
         link_text = "\n".join([str(l) for l in (links or [])])
-        res = chain_email.invoke({
+        return self._invoke(prompt_email, {
             "candidate_name": candidate_name,
             "company": company,
             "role": role,
             "link_list": link_text
-        })
-        return res.content
+        }, name="write_mail_for_candidate")
 
 
     # app/chains.py (inside the same class, e.g., Chain or whatever class holds LLM helper methods)
@@ -120,56 +406,60 @@ class Chain:
         # format links into a simple bullet or inline string
         links_text = "\n".join([f"- {l}" for l in (portfolio_links or [])]) or "No portfolio links available."
 
-        chain_email = prompt | self.llm
-        resp = chain_email.invoke({
+        return self._invoke(prompt, {
             "candidate_name": candidate_name,
             "company": company,
             "role": role,
             "links": links_text
-        })
-        return resp.content
+        }, name="write_application_email")
 
-    def extract_projects_and_experiences(self, company, role, job_description=None, resume_json_file="data/resume.json"):
+    def extract_projects_and_experiences(self, company, role, job_description=None, resume_json_file="data/resume.json",
+                                         resume_text=None, resume=None, max_resume_tokens=None, candidate_ids=None):
         """
         Extract relevant projects and experiences from the resume JSON file for the given company and role.
         If job_description is provided, use it to better tailor the extraction.
+        Pass `resume_text` (the raw JSON already read) to skip re-reading `resume_json_file`, or `resume`
+        (a CompactResume built once per batch) to also skip compacting it.
+        The model only sees one short line per entry and answers with entry ids, which are mapped back to
+        the full entries here. `max_resume_tokens` caps the resume part of the prompt (see CompactResume.select_ids);
+        `candidate_ids` instead names the entries to show, e.g. a ResumeSelector shortlist for the model to rerank.
         Returns a dict with `projects` and `experience` keys.
         """
-        resume_data = open(resume_json_file, "r").read()
+        if resume is None:
+            resume_data = resume_text if resume_text is not None else open(resume_json_file, "r").read()
+            resume = CompactResume.from_json(resume_data)
+        ids = candidate_ids if candidate_ids is not None else \
+            resume.select_ids(f"{role} {job_description or ''}", max_resume_tokens)
         prompt = PromptTemplate.from_template(
             """
-            You've been provided with a resume in JSON format. Based on the company, role and job description (if provided), you need to extract the relevant projects and experiences from the JSON to build a tailored CV.
+            You've been provided with the projects and work experience from a resume, one entry per line as `id: summary`. Ids starting with `p` are projects, ids starting with `e` are experience. Based on the company, role and job description (if provided), you need to select the relevant entries to build a tailored CV.
 
             Company: {company}
             Role: {role}
             Job Description: {job_description}
 
-            Resume JSON:
-            {resume_data}
+            Resume entries:
+            {resume_entries}
 
             Instructions:
             Only output a valid JSON text containing the `projects` and `experience` keys.
-            Each key should map to a list of relevant items extracted from the resume JSON.
+            Each key should map to a list of the ids of the relevant entries, most relevant first, e.g. {{"projects": ["p2", "p1"], "experience": ["e1"]}}.
             Ensure that the selected projects and experiences are highly relevant to the specified role and company.
 
             **Do not include any additional commentary or text or quotes or backticks outside of the JSON structure.**
             """
         )
 
-        chain = prompt | self.llm
-        res = chain.invoke({
-            "company": company,
-            "role": role,
-            "job_description": job_description or "N/A",
-            "resume_data": resume_data
-        })
         try:
-            json_parser = JsonOutputParser()
-            res = json_parser.parse(res.content)
+            res = self._invoke_json(prompt, {
+                "company": company,
+                "role": role,
+                "job_description": job_description or "N/A",
+                "resume_entries": resume.prompt_text(ids)
+            }, ResumeSelection, name="select_resume_entries")
         except OutputParserException:
             raise OutputParserException("Unable to parse CV JSON.")
-        return res
-
+        return resume.rehydrate(res)
 
 if __name__ == "__main__":
     print(os.getenv("GROQ_API_KEY"))
\ No newline at end of file
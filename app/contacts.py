@@ -0,0 +1,41 @@
+import csv
+import re
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def iter_contacts(csv_path, chunk_size=500, stats=None):
+    """
+    Stream a mail-merge CSV (columns: name,email,company) in chunks of up to `chunk_size` rows.
+
+    Rows without a well-formed email are dropped, and so are repeats of an email already seen
+    (compared case-insensitively), so only the current chunk and the set of seen addresses are
+    held in memory. Pass a dict as `stats` to get `rows`, `invalid` and `duplicates` counts.
+    """
+    if stats is None:
+        stats = {}
+    stats.update(rows=0, invalid=0, duplicates=0)
+    seen = set()
+    chunk = []
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            stats["rows"] += 1
+            email = (row.get("email") or "").strip()
+            if not EMAIL_RE.match(email):
+                stats["invalid"] += 1
+                continue
+            key = email.lower()
+            if key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            chunk.append({
+                "name": (row.get("name") or "").strip() or "there",
+                "email": email,
+                "company": (row.get("company") or "").strip()
+            })
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
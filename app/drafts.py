@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DRAFT_FIELDS = ("name", "email", "company", "subject", "body", "resume_file")
+
+
+class DraftStore:
+    """
+    SQLite-backed store for generated mail-merge drafts, grouped into batches.
+
+    Drafts are written as they are generated and read back a page or a chunk at a time, so neither
+    the Streamlit session nor the browser has to hold a whole contact list's worth of email bodies.
+    """
+    def __init__(self, path=".cache/drafts.sqlite"):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS drafts ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, batch_id TEXT NOT NULL, "
+            "name TEXT, email TEXT NOT NULL, company TEXT, subject TEXT, body TEXT, resume_file TEXT, "
+            "created REAL NOT NULL, UNIQUE (batch_id, email))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def new_batch() -> str:
+        return uuid.uuid4().hex
+
+    def add(self, batch_id, draft: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO drafts (batch_id, name, email, company, subject, body, resume_file, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (batch_id, *(draft.get(field) for field in DRAFT_FIELDS), time.time())
+            )
+            self._conn.commit()
+
+    def count(self, batch_id) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM drafts WHERE batch_id = ?", (batch_id,)).fetchone()[0]
+
+    def page(self, batch_id, offset=0, limit=20) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(DRAFT_FIELDS)} FROM drafts WHERE batch_id = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (batch_id, limit, offset)
+            ).fetchall()
+        return [dict(zip(DRAFT_FIELDS, row)) for row in rows]
+
+    def iter_drafts(self, batch_id, chunk_size=500):
+        """Yield every draft of the batch in generation order, reading `chunk_size` rows at a time."""
+        last_seq = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT seq, {', '.join(DRAFT_FIELDS)} FROM drafts WHERE batch_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (batch_id, last_seq, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(DRAFT_FIELDS, row[1:]))
+            last_seq = rows[-1][0]
+
+    def delete_batch(self, batch_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM drafts WHERE batch_id = ?", (batch_id,))
+            self._conn.commit()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from json_output import extract_json
+
+ROLES = ["Software Engineer", "Data Engineer", "Backend Developer", "ML Engineer", "DevOps Engineer",
+         "Frontend Developer", "QA Engineer", "Site Reliability Engineer"]
+SKILLS = ["Python", "Java", "React", "AWS", "Kubernetes", "SQL", "Machine Learning", "Go", "Docker", "C++"]
+
+
+class FakeRateLimitError(Exception):
+    """Looks like a provider 429 to utils.is_rate_limit_error / retry_after_seconds."""
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("Error code: 429 - rate limit exceeded (fake)")
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": str(retry_after)})
+
+
+class FakeLLMError(Exception):
+    status_code = 500
+
+
+class FakeJSONValidateError(Exception):
+    """Looks like Groq's 400 `json_validate_failed`: JSON mode refusing to return invalid JSON."""
+    status_code = 400
+
+    def __init__(self, failed_generation):
+        super().__init__("Error code: 400 - Failed to generate JSON (fake)")
+        self.body = {"error": {"message": "Failed to generate JSON. Please adjust your prompt.",
+                               "type": "invalid_request_error", "code": "json_validate_failed",
+                               "failed_generation": failed_generation}}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the Groq chat model, for running Chain offline.
+
+    The answer is chosen from the prompt: the job-extraction prompt gets {"jobs": [posting, ...]}, the
+    resume-tailoring prompt gets the ids of the first resume entries it was shown, and anything else
+    gets a templated email. Each call waits `latency` seconds (+/- `jitter` as a fraction) and
+    streams at `tokens_per_second` (0 = all at once); `rate_limit_rate` of the calls raise a 429 and
+    `error_rate` a 500. `malformed_rate` of the JSON answers are broken the way real models break them:
+    wrapped in code fences or prose, which in JSON mode (response_format) is refused with a 400 like
+    Groq's json_validate_failed, or, in JSON mode only, syntactically valid but with a list
+    double-encoded as a JSON string; a fix-up prompt (chains.FIX_JSON_PROMPT) repairs them.
+    Outcomes are seeded by the prompt and how often it was sent, so a run is reproducible and a
+    retried prompt can succeed. Token counts are estimated at 4 characters per token.
+    """
+    latency: float = 0.2
+    jitter: float = 0.25
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    malformed_rate: float = 0.0
+    retry_after: float = 0.5
+    jobs_per_page: int = 3
+    seed: int = 0
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _sent: dict = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def from_env(cls):
+        """Build from FAKE_LLM_* environment variables (see .env.example)."""
+        return cls(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", 0.2)),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", 0)),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", 0)),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", 0)),
+            malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", 0)),
+            seed=int(os.getenv("FAKE_LLM_SEED", 0)),
+        )
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    @staticmethod
+    def count_tokens(text):
+        return max(1, len(text) // 4)
+
+    def _rng(self, prompt):
+        with self._lock:
+            attempt = self._sent.get(prompt, 0)
+            self._sent[prompt] = attempt + 1
+        digest = hashlib.sha256(f"{self.seed}:{attempt}:{prompt}".encode("utf-8")).digest()
+        return random.Random(digest)
+
+    def _respond(self, prompt, rng, json_mode=False):
+        """Sleep for the call latency, maybe fail, and return the completion text."""
+        time.sleep(max(0.0, self.latency * (1 + rng.uniform(-self.jitter, self.jitter))))
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            raise FakeRateLimitError(self.retry_after)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise FakeLLMError("Error code: 500 - internal error (fake)")
+        if "### INVALID JSON:" in prompt:
+            return self._fix(prompt)
+        if "extract the job postings" in prompt:
+            return self._malform(self._jobs(rng), rng, json_mode)
+        if "`projects` and `experience`" in prompt:
+            return self._malform(self._tailored(prompt), rng, json_mode)
+        return self._email(prompt, rng)
+
+    def _malform(self, text, rng, json_mode):
+        if rng.random() >= self.malformed_rate:
+            return text
+        if json_mode and rng.random() < 0.5:
+            value = json.loads(text)
+            key = next(k for k, v in value.items() if isinstance(v, list))
+            value[key] = json.dumps(value[key])
+            return json.dumps(value)
+        if rng.random() < 0.5:
+            broken = f"```json\n{text}\n```"
+        else:
+            broken = f"Here is the JSON you asked for:\n{text}\nLet me know if you need anything else."
+        if json_mode:
+            raise FakeJSONValidateError(broken)
+        return broken
+
+    @staticmethod
+    def _fix(prompt):
+        output = prompt.split("### INVALID JSON:", 1)[1].split("### ERROR:", 1)[0]
+        value, _ = extract_json(output)
+        if isinstance(value, dict):
+            value = {k: json.loads(v) if isinstance(v, str) and v.startswith("[") else v for k, v in value.items()}
+        return json.dumps(value)
+
+    def _jobs(self, rng):
+        jobs = []
+        for _ in range(self.jobs_per_page):
+            role = rng.choice(ROLES)
+            jobs.append({
+                "role": role,
+                "experience": f"{rng.randint(1, 8)}+ years",
+                "skills": rng.sample(SKILLS, 3),
+                "description": f"We are hiring a {role} to build and run our platform. " * 3,
+            })
+        return json.dumps({"jobs": jobs})
+
+    @staticmethod
+    def _tailored(prompt):
+        ids = re.findall(r"^\s*([pe]\d+):", prompt, re.MULTILINE)
+        return json.dumps({"projects": [i for i in ids if i.startswith("p")][:3],
+                           "experience": [i for i in ids if i.startswith("e")][:2]})
+
+    @staticmethod
+    def _email(prompt, rng):
+        links = [word for word in prompt.split() if word.startswith("http")][:2]
+        return (
+            "Subject: Application\n\nDear Hiring Manager,\n\n"
+            "I am writing to express my interest in the open role. "
+            + "My background in building reliable software matches what your team is looking for. " * rng.randint(2, 4)
+            + (f"You can find relevant work at {' and '.join(links)}. " if links else "")
+            + "I would welcome the chance to discuss next steps.\n\nBest regards"
+        )
+
+    def _usage(self, prompt, text):
+        input_tokens, output_tokens = self.count_tokens(prompt), self.count_tokens(text)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = self._respond(prompt, self._rng(prompt), json_mode="response_format" in kwargs)
+        if self.tokens_per_second:
+            time.sleep(self.count_tokens(text) / self.tokens_per_second)
+        usage = self._usage(prompt, text)
+        message = AIMessage(content=text, usage_metadata=usage,
+                            response_metadata={"model_name": "fake", "token_usage": usage})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = self._respond(prompt, self._rng(prompt), json_mode="response_format" in kwargs)
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == len(words) - 1 else word + " "
+            if self.tokens_per_second:
+                time.sleep(self.count_tokens(piece) / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, text)))
@@ -0,0 +1,173 @@
+import json
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from ResumeEditor import Resume
+from latex_compiler import LatexCompilerPool
+from metrics import metrics
+from render_store import RenderStore
+from resume_context import CompactResume
+from resume_selector import SELECTION_MODES, ResumeSelector
+from utils import RateLimiter, call_with_backoff
+
+
+class GenerationContext:
+    """
+    Work shared by every row of one mail-merge batch.
+
+    The resume is read once (and its heading, education and skills LaTeX rendered once), portfolio
+    links are resolved once per distinct role and the tailored projects/experience LLM call is made
+    once per distinct (company, role) pair, so a batch costs LLM calls per company rather than per
+    contact. The selection prompt carries the compacted resume (see CompactResume), capped at
+    `max_resume_tokens` when set; entries are then ranked against the role with the portfolio's
+    embedding function.
+
+    `selection_mode` picks how projects/experience are chosen: "llm" asks the model, "local" ranks the
+    entries by vector similarity to the role (no LLM call), "hybrid" lets the model rerank a local
+    shortlist.
+    """
+    def __init__(self, llm, portfolio, llm_pool, limiter=None, compiler=None, store=None, resume_json_file="data/resume.json",
+                 max_resume_tokens=None, selection_mode="llm"):
+        self.llm = llm
+        self.portfolio = portfolio
+        self.llm_pool = llm_pool
+        self.compiler = compiler
+        self.store = store or RenderStore()
+        self.limiter = limiter
+        with open(resume_json_file, "r") as f:
+            self.resume_text = f.read()
+        self.resume_data = json.loads(self.resume_text)
+        self.max_resume_tokens = max_resume_tokens
+        embedding_function = getattr(portfolio, "embedding_function", None) if max_resume_tokens else None
+        self.compact_resume = CompactResume(self.resume_data, embedding_function)
+        if selection_mode not in SELECTION_MODES:
+            raise ValueError(f"Unknown selection mode {selection_mode!r}; expected one of {SELECTION_MODES}")
+        self.selection_mode = selection_mode
+        self.selector = ResumeSelector(portfolio, self.compact_resume) if selection_mode != "llm" else None
+        self._lock = threading.Lock()
+        self._links = {}
+        self._tailored = {}
+        # heading, education and skills LaTeX, rendered by the first resume of the batch
+        self._sections = {}
+
+    @staticmethod
+    def _key(value):
+        return " ".join((value or "").lower().split())
+
+    def links_for(self, role):
+        key = self._key(role)
+        with self._lock:
+            if key not in self._links:
+                # query portfolio links using role (simple: treat role as a skill query)
+                self._links[key] = self.portfolio.query_links([role])
+            return self._links[key]
+
+    def tailored_for(self, company, role):
+        """
+        Return a Future for the projects/experience selection of (company, role).
+        The first row to ask submits the selection; later rows for the same pair share its Future.
+        """
+        key = (self._key(company), self._key(role))
+        with self._lock:
+            if key not in self._tailored:
+                self._tailored[key] = self.llm_pool.submit(self._select, company, role)
+            return self._tailored[key]
+
+    def _select(self, company, role):
+        if self.selection_mode == "local":
+            return self.selector.select(role)
+        candidate_ids = self.selector.shortlist(role) if self.selection_mode == "hybrid" else None
+        return call_with_backoff(
+            self.llm.extract_projects_and_experiences, company, role, resume=self.compact_resume,
+            max_resume_tokens=self.max_resume_tokens, candidate_ids=candidate_ids, limiter=self.limiter
+        )
+
+    def build_resume(self, llm_data):
+        resume_data = self.resume_data
+        return Resume(
+            education=resume_data.get("education", []),
+            experience=llm_data.get("experience", []),
+            projects=llm_data.get("projects", []),
+            skills=resume_data.get("skills", {}),
+            name=resume_data.get("name", ""),
+            phone=resume_data.get("contact", {}).get("phone", ""),
+            email=resume_data.get("contact", {}).get("email", ""),
+            linkedin=resume_data.get("contact", {}).get("linkedin", ""),
+            github=resume_data.get("contact", {}).get("github", ""),
+            section_cache=self._sections
+        )
+
+
+def compose_draft(ctx, row, role):
+    """
+    The LLM part of a draft for a CSV `row`: subject, email body and the projects/experience selection
+    for its resume. The email and the selection are independent LLM calls, so the selection is
+    requested from the context (possibly already in flight for this company) while the email is
+    written on the current thread. Errors are raised.
+    """
+    name = row.get("name", "there")
+    company = row.get("company", "")
+    with metrics.stage("draft.compose"):
+        links = ctx.links_for(role)
+        tailored = ctx.tailored_for(company, role)
+        body = call_with_backoff(ctx.llm.write_application_email_for_role, name, company, role, links, limiter=ctx.limiter)
+        return {"subject": f"Regarding {role} opportunities at {company}", "body": body, "selection": tailored.result()}
+
+
+def render_draft(ctx, selection):
+    """Render the tailored resume for `selection` through the context's RenderStore; returns its file name."""
+    with metrics.stage("draft.render"):
+        resume = ctx.build_resume(selection)
+        return ctx.store.get_or_render(resume, "_".join(ctx.resume_data.get("name", "").split()), ctx.compiler)
+
+
+def generate_draft(ctx, row, role):
+    """
+    Build one mail-merge draft for a CSV `row`: the application email and the tailored resume PDF.
+    A failure is reported in the body instead of raised.
+    """
+    name = row.get("name", "there")
+    company = row.get("company", "")
+    subject = f"Regarding {role} opportunities at {company}"
+    resume_file = None
+    try:
+        composed = compose_draft(ctx, row, role)
+        subject, body = composed["subject"], composed["body"]
+        resume_file = render_draft(ctx, composed["selection"])
+    except Exception as e:
+        body = f"Could not generate email due to: {e}"
+    return {
+        "name": name, "email": row.get("email"), "company": company,
+        "subject": subject, "body": body, "resume_file": resume_file
+    }
+
+
+def generate_drafts(llm, portfolio, rows, role, max_workers=4, max_requests_per_minute=0, max_compile_workers=None, store=None,
+                    max_resume_tokens=None, selection_mode="llm"):
+    """
+    Generate drafts for every row with an email, `max_workers` rows at a time.
+    Yields each draft as soon as it is finished, so callers can show progress while the batch runs;
+    drafts therefore arrive in completion order, not CSV order.
+    All workers share one RateLimiter, so a 429 on any row pauses the whole batch briefly, and one
+    LatexCompilerPool (one pdflatex per CPU by default) for the resume PDFs, which are deduplicated by
+    content through `store` (a RenderStore). `max_resume_tokens` caps the resume in the selection prompt;
+    `selection_mode` is "llm", "local" or "hybrid" (see GenerationContext).
+    """
+    limiter = RateLimiter(max_requests_per_minute)
+    with ThreadPoolExecutor(max_workers=max_workers) as row_pool, \
+            ThreadPoolExecutor(max_workers=max_workers) as llm_pool, \
+            LatexCompilerPool(max_workers=max_compile_workers) as compiler:
+        ctx = GenerationContext(llm, portfolio, llm_pool, limiter, compiler, store, max_resume_tokens=max_resume_tokens,
+                                selection_mode=selection_mode)
+        # rows are pulled lazily with a bounded number in flight, so `rows` can be a stream
+        pending = set()
+        for row in rows:
+            if not row.get("email"):
+                continue
+            pending.add(row_pool.submit(generate_draft, ctx, row, role))
+            if len(pending) >= max_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(pending):
+            yield future.result()
@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Row states, in pipeline order. A row in "sending" was handed to the transport but its outcome was
+# never recorded (the run died mid-send), so it may or may not have been delivered.
+PENDING, GENERATED, RENDERED, SENDING, SENT = "pending", "generated", "rendered", "sending", "sent"
+STATUSES = (PENDING, GENERATED, RENDERED, SENDING, SENT)
+
+ROW_FIELDS = ("email", "name", "company", "status", "subject", "body", "selection", "resume_file",
+              "message_id", "error", "attempts")
+
+
+class JobJournal:
+    """
+    SQLite journal of headless mail-merge jobs (see runner.py).
+
+    Every contact of a job is one row that moves pending -> generated -> rendered -> sending -> sent,
+    and each stage's output (email, resume selection, PDF name, message id) is committed as soon as
+    that row finishes it. A failed stage leaves the row where it was, with the error and an attempt
+    count, so re-running the job picks up exactly the rows that still need work.
+    """
+    def __init__(self, path=".cache/jobs.sqlite"):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, options TEXT NOT NULL, created REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS job_rows ("
+            "job_id TEXT NOT NULL, seq INTEGER NOT NULL, email TEXT NOT NULL, name TEXT, company TEXT, "
+            "status TEXT NOT NULL, subject TEXT, body TEXT, selection TEXT, resume_file TEXT, message_id TEXT, "
+            "error TEXT, attempts INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL, "
+            "PRIMARY KEY (job_id, email));"
+            "CREATE INDEX IF NOT EXISTS job_rows_status ON job_rows (job_id, status, seq);"
+        )
+        self._conn.commit()
+
+    def job_options(self, job_id):
+        """The options the job was created with, or None for an unknown job."""
+        with self._lock:
+            row = self._conn.execute("SELECT options FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create_job(self, job_id, options: dict):
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO jobs (job_id, options, created) VALUES (?, ?, ?)",
+                               (job_id, json.dumps(options), time.time()))
+            self._conn.commit()
+
+    def add_contacts(self, job_id, contacts) -> int:
+        """Add contacts not yet in the job (by email); returns how many were new."""
+        with self._lock:
+            seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM job_rows WHERE job_id = ?",
+                                     (job_id,)).fetchone()[0]
+            added = 0
+            for contact in contacts:
+                seq += 1
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO job_rows (job_id, seq, email, name, company, status, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, seq, contact["email"], contact.get("name"), contact.get("company"), PENDING, time.time())
+                )
+                added += cursor.rowcount
+            self._conn.commit()
+        return added
+
+    def rows(self, job_id, status, max_attempts=None, chunk_size=500):
+        """Yield the job's rows in `status`, in CSV order, reading `chunk_size` at a time."""
+        last_seq = 0
+        while True:
+            query = (f"SELECT seq, {', '.join(ROW_FIELDS)} FROM job_rows "
+                     "WHERE job_id = ? AND status = ? AND seq > ?")
+            params = [job_id, status, last_seq]
+            if max_attempts:
+                query += " AND attempts < ?"
+                params.append(max_attempts)
+            with self._lock:
+                rows = self._conn.execute(query + " ORDER BY seq LIMIT ?", (*params, chunk_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                record = dict(zip(ROW_FIELDS, row[1:]))
+                record["selection"] = json.loads(record["selection"]) if record["selection"] else None
+                yield record
+            last_seq = rows[-1][0]
+
+    def advance(self, job_id, email, status, **fields):
+        """
+        Move a row to `status`, storing the stage's output. The error and attempt count of the stage it
+        finished are cleared, so the next stage gets its own `max_attempts`.
+        """
+        if "selection" in fields:
+            fields["selection"] = json.dumps(fields["selection"])
+        fields.update(status=status, error=None, attempts=0, updated=time.time())
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE job_rows SET {assignments} WHERE job_id = ? AND email = ?",
+                               (*fields.values(), job_id, email))
+            self._conn.commit()
+
+    def advance_many(self, job_id, emails, status):
+        with self._lock:
+            self._conn.executemany("UPDATE job_rows SET status = ?, updated = ? WHERE job_id = ? AND email = ?",
+                                   [(status, time.time(), job_id, email) for email in emails])
+            self._conn.commit()
+
+    def fail(self, job_id, email, error, status=None):
+        """Record a failed attempt; the row keeps its status (or moves back to `status`)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_rows SET error = ?, attempts = attempts + 1, updated = ?, status = COALESCE(?, status) "
+                "WHERE job_id = ? AND email = ?",
+                (str(error), time.time(), status, job_id, email)
+            )
+            self._conn.commit()
+
+    def counts(self, job_id) -> dict:
+        """Rows per status, plus `failed`: rows whose last attempt errored."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM job_rows WHERE job_id = ? GROUP BY status",
+                                      (job_id,)).fetchall()
+            failed = self._conn.execute("SELECT COUNT(*) FROM job_rows WHERE job_id = ? AND error IS NOT NULL",
+                                        (job_id,)).fetchone()[0]
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(rows)
+        counts["failed"] = failed
+        return counts
+
+    def errors(self, job_id, limit=20) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT email, status, attempts, error FROM job_rows WHERE job_id = ? AND error IS NOT NULL "
+                "ORDER BY seq LIMIT ?", (job_id, limit)
+            ).fetchall()
+        return [dict(zip(("email", "status", "attempts", "error"), row)) for row in rows]
@@ -0,0 +1,98 @@
+import json
+import re
+from typing import List, Optional, Union
+
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, model_validator
+
+# how many `{` / `[` positions to try as the start of the JSON value before giving up
+MAX_JSON_STARTS = 20
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class JobPosting(BaseModel):
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+
+    role: Optional[str] = None
+    experience: Optional[str] = None
+    skills: Union[List[str], str] = Field(default_factory=list)
+    description: Optional[str] = ""
+
+
+class JobPostings(BaseModel):
+    """Answer of the job-extraction prompt: {"jobs": [posting, ...]}."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    jobs: List[JobPosting]
+
+    @model_validator(mode="before")
+    @classmethod
+    def _wrap(cls, value):
+        # free-text completions (and older cached ones) give a bare list or a single posting
+        if isinstance(value, list):
+            return {"jobs": value}
+        if isinstance(value, dict) and "jobs" not in value and "role" in value:
+            return {"jobs": [value]}
+        return value
+
+
+class EntryRef(BaseModel):
+    """A resume entry given as an object instead of a bare id, e.g. {"id": "p2"}."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    id: str
+
+
+class ResumeSelection(BaseModel):
+    """Answer of the resume-selection prompt: entry ids per section, most relevant first."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    projects: List[Union[str, EntryRef]] = Field(default_factory=list)
+    experience: List[Union[str, EntryRef]] = Field(default_factory=list)
+
+
+def extract_json(text: str):
+    """
+    The first JSON value in `text`, tolerating what models wrap around it: code fences, a preamble or
+    trailing prose, and trailing commas. Returns (value, repaired) where `repaired` says whether the
+    text was not valid JSON as it stood. Raises OutputParserException if no JSON value is found.
+    """
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+    decoder = json.JSONDecoder()
+    for candidate in (text, _TRAILING_COMMA.sub(r"\1", text)):
+        for i, match in enumerate(re.finditer(r"[\[{]", candidate)):
+            if i >= MAX_JSON_STARTS:
+                break
+            try:
+                return decoder.raw_decode(candidate, match.start())[0], True
+            except ValueError:
+                continue
+    raise OutputParserException("No JSON value found in the completion.", llm_output=text)
+
+
+def failed_generation(exc):
+    """
+    The completion a provider refused to return in JSON mode, or None if `exc` is not such a refusal.
+    Groq answers invalid JSON with a 400 `json_validate_failed` carrying it as `failed_generation`.
+    """
+    body = getattr(exc, "body", None)
+    error = body.get("error", body) if isinstance(body, dict) else None
+    if isinstance(error, dict) and error.get("code") == "json_validate_failed":
+        return error.get("failed_generation") or ""
+    return None
+
+
+def parse_json(text: str, schema):
+    """
+    Parse `text` (see extract_json) and validate it against the pydantic model `schema`.
+    Returns (dict, repaired); raises OutputParserException, carrying the text, if either step fails.
+    """
+    value, repaired = extract_json(text)
+    try:
+        return schema.model_validate(value).model_dump(), repaired
+    except ValidationError as e:
+        errors = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'value'}: {err['msg']}" for err in e.errors())
+        raise OutputParserException(f"JSON does not match the schema: {errors}", llm_output=text)
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from metrics import metrics
+
+
+_format_lock = threading.Lock()
+_format_failures = set()
+
+
+@lru_cache(maxsize=None)
+def _pdflatex_version() -> str:
+    try:
+        proc = subprocess.run(["pdflatex", "--version"], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return proc.stdout.decode("utf-8", errors="replace")
+
+
+def precompiled_format(preamble: str, cache_dir=".cache/latex", timeout=120):
+    """
+    Return the path of a pdflatex format (without the .fmt suffix) with `preamble` already loaded,
+    building it with mylatexformat on first use. The file name carries a hash of the preamble and of
+    `pdflatex --version`, so editing the template or upgrading TeX produces a new format instead of
+    reusing a stale one.
+
+    Returns None when the format cannot be built (no pdflatex/mylatexformat, or a package that
+    refuses to be dumped); callers then compile the full document cold.
+    """
+    name = "resume-" + hashlib.sha256((_pdflatex_version() + preamble).encode("utf-8")).hexdigest()[:16]
+    fmt_base = os.path.abspath(os.path.join(cache_dir, name))
+    if os.path.exists(fmt_base + ".fmt"):
+        return fmt_base
+    with _format_lock:
+        if os.path.exists(fmt_base + ".fmt"):
+            return fmt_base
+        if name in _format_failures:
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="resume-fmt-") as workdir:
+            with open(os.path.join(workdir, "preamble.tex"), "w") as f:
+                f.write(preamble + "\n\\begin{document}\n\\end{document}\n")
+            try:
+                # mylatexformat dumps everything up to \begin{document}
+                subprocess.run(
+                    ["pdflatex", "-ini", "-interaction=nonstopmode", f"-jobname={name}",
+                     "&pdflatex", "mylatexformat.ltx", "preamble.tex"],
+                    cwd=workdir, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    timeout=timeout
+                )
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            built = os.path.join(workdir, name + ".fmt")
+            if not os.path.exists(built):
+                _format_failures.add(name)
+                return None
+            shutil.move(built, fmt_base + ".fmt")
+    return fmt_base
+
+
+def discard_format(fmt):
+    """Delete a format that no longer loads and stop rebuilding it in this process."""
+    with _format_lock:
+        _format_failures.add(os.path.basename(fmt))
+        try:
+            os.remove(fmt + ".fmt")
+        except FileNotFoundError:
+            pass
+
+
+def compile_latex(tex, output_path: str, output_dir="pdfs", timeout=60, fmt=None) -> dict:
+    """
+    Compile `tex` with pdflatex inside a private temporary directory and move the PDF to
+    `output_dir/output_path`. Intermediate files (.tex/.aux/.log/.out) live and die with the
+    temp dir, so concurrent jobs never see each other's artifacts.
+    `tex` is the document, or a callable that writes it piece by piece to the `write` function it is
+    given (e.g. Resume.write_full_resume_latex), which streams it into the .tex file.
+    `fmt` is a format from precompiled_format; pdflatex then skips the document's preamble. If the
+    compile with it fails, the document is compiled once more without it, and when that works the
+    format is discarded (a format dumped by another pdflatex or package version no longer loads).
+
+    Returns {"ok", "path", "error", "seconds"}; `path` is None when no PDF was produced.
+    """
+    jobname = os.path.splitext(os.path.basename(output_path))[0]
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    path, error = _compile(tex, jobname, output_dir, timeout, fmt)
+    if error is not None and fmt:
+        path, error = _compile(tex, jobname, output_dir, timeout, None)
+        if error is None:
+            discard_format(fmt)
+    seconds = time.perf_counter() - started
+    metrics.observe("latex.compile", seconds, error=path is None)
+    return {"ok": path is not None, "path": path, "error": error, "seconds": seconds}
+
+
+def _compile(tex, jobname, output_dir, timeout, fmt):
+    """One pdflatex run in a fresh temp dir; returns (PDF path or None, error or None)."""
+    with tempfile.TemporaryDirectory(prefix="resume-") as workdir:
+        with metrics.stage("render.latex_source"), open(os.path.join(workdir, "resume.tex"), "w") as f:
+            if callable(tex):
+                tex(f.write)
+            else:
+                f.write(tex)
+        cmd = ["pdflatex", "-interaction=nonstopmode", "-halt-on-error", f"-jobname={jobname}"]
+        env = None
+        if fmt:
+            cmd.append(f"-fmt={os.path.basename(fmt)}")
+            env = dict(os.environ, TEXFORMATS=os.path.dirname(fmt) + os.pathsep)
+        error = None
+        try:
+            proc = subprocess.run(
+                cmd + ["resume.tex"],
+                cwd=workdir, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                timeout=timeout
+            )
+            if proc.returncode != 0:
+                # pdflatex reports errors on stdout as lines starting with "!"
+                output = proc.stdout.decode("utf-8", errors="replace").splitlines()
+                errors = [line for line in output if line.startswith("!")]
+                error = errors[0] if errors else f"pdflatex exited with status {proc.returncode}"
+        except subprocess.TimeoutExpired:
+            error = f"pdflatex timed out after {timeout}s"
+        except FileNotFoundError:
+            error = "pdflatex not found; install a TeX distribution"
+
+        pdf = os.path.join(workdir, jobname + ".pdf")
+        path = None
+        if error is None and os.path.exists(pdf):
+            path = os.path.join(output_dir, jobname + ".pdf")
+            shutil.move(pdf, path)
+        elif error is None:
+            error = "pdflatex produced no PDF"
+    return path, error
+
+
+class LatexCompilerPool:
+    """
+    Runs compile_latex jobs in parallel. Each pdflatex is its own process, so a thread pool is
+    enough to keep `max_workers` cores busy; it defaults to the number of CPUs.
+    """
+    def __init__(self, max_workers=None, output_dir="pdfs", timeout=60):
+        self.output_dir = output_dir
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1)
+
+    def submit(self, tex, output_path: str, fmt=None):
+        """Queue a compile and return a Future resolving to the compile_latex result dict."""
+        return self._pool.submit(compile_latex, tex, output_path, self.output_dir, self.timeout, fmt)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
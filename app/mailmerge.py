@@ -6,16 +6,42 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
+from email import policy as email_policy
 import mimetypes
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import make_msgid
+from google.auth.credentials import AnonymousCredentials
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
+from metrics import metrics
+from utils import TokenBucket, jittered_delay
 
 SCOPES = ['https://www.googleapis.com/auth/gmail.send']
 
+# Gmail allows 250 quota units per user per second and messages.send costs 100 units.
+SENDS_PER_SECOND = 2.5
+# Google recommends at most 50 calls per batch request to avoid rate-limit errors.
+BATCH_SIZE = 50
+
 def gmail_authenticate(creds_filename="credentials-mail-merge.json", token_filename="token.json"):
-    """Authenticate user and return Gmail API service"""
+    """
+    Authenticate user and return Gmail API service.
+    If GMAIL_API_ENDPOINT is set (e.g. a local fake Gmail server), an unauthenticated service
+    pointed at that endpoint is returned instead.
+    """
+    api_endpoint = os.getenv("GMAIL_API_ENDPOINT")
+    if api_endpoint:
+        return build('gmail', 'v1', credentials=AnonymousCredentials(),
+                     client_options={"api_endpoint": api_endpoint})
     creds = None
     base_dir = os.path.dirname(__file__)
     creds_path = os.path.join(base_dir, creds_filename)
@@ -37,38 +63,23 @@ def gmail_authenticate(creds_filename="credentials-mail-merge.json", token_filen
             token.write(creds.to_json())
     return build('gmail', 'v1', credentials=creds)
 
-def create_message(sender, to, subject, message_text, attachments=None):
+class AttachmentCache:
     """
-    Create a MIME message with optional attachments and return a dict with a base64url 'raw' string.
+    Attachment MIME parts, already base64-encoded and serialized, keyed by file path + mtime + size.
 
-    attachments: list of file paths (strings). Files will be attached if found; missing files are skipped.
+    Many recipients usually get the same resume PDF, so each file is read and encoded once and the
+    bytes are spliced into every message that attaches it. Least recently used parts are dropped once
+    the cache holds more than `max_bytes`; a changed file gets a new key and is re-encoded. Parts are
+    kept per line ending, since SMTP needs CRLF while the Gmail API takes the default LF.
     """
-    if attachments is None:
-        attachments = []
-
-    # Create a multipart message container
-    message = MIMEMultipart()
-    message['to'] = to
-    message['from'] = sender
-    message['subject'] = subject
-
-    # Attach the body as plain text
-    body_part = MIMEText(message_text, 'plain', 'utf-8')
-    message.attach(body_part)
-
-    # Attach files
-    for attachment in attachments:
-        # Try the provided path first, then try relative to this file
-        path = attachment
-        if not os.path.exists(path):
-            alt = os.path.join(os.path.dirname(__file__), attachment)
-            if os.path.exists(alt):
-                path = alt
-            else:
-                # Attachment missing; skip but keep processing others
-                print(f"Attachment not found, skipping: {attachment}")
-                continue
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._parts = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
 
+    @staticmethod
+    def _encode(path, policy):
         ctype, encoding = mimetypes.guess_type(path)
         if ctype is None or encoding is not None:
             ctype = 'application/octet-stream'
@@ -79,9 +90,87 @@ def create_message(sender, to, subject, message_text, attachments=None):
             part.set_payload(f.read())
         encoders.encode_base64(part)
         part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(path))
-        message.attach(part)
+        return part.as_bytes(policy=policy)
+
+    def get(self, path, policy=email_policy.compat32) -> bytes:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, policy.linesep)
+        with self._lock:
+            if key in self._parts:
+                self._parts.move_to_end(key)
+                return self._parts[key]
+        part = self._encode(path, policy)
+        if len(part) > self.max_bytes:
+            return part
+        with self._lock:
+            if key not in self._parts:
+                self._parts[key] = part
+                self._size += len(part)
+                while self._size > self.max_bytes:
+                    _, evicted = self._parts.popitem(last=False)
+                    self._size -= len(evicted)
+        return part
 
-    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+_attachment_cache = AttachmentCache()
+
+def _resolve_attachment(attachment):
+    # Try the provided path first, then try relative to this file
+    if os.path.exists(attachment):
+        return attachment
+    alt = os.path.join(os.path.dirname(__file__), attachment)
+    if os.path.exists(alt):
+        return alt
+    # Attachment missing; skip but keep processing others
+    print(f"Attachment not found, skipping: {attachment}")
+    return None
+
+def build_message_bytes(sender, to, subject, message_text, attachments=None, headers=None, cache=None,
+                        policy=email_policy.compat32):
+    """
+    Serialize a MIME message with optional attachments to bytes.
+
+    Only the headers and text body are generated per message; attachment parts come pre-encoded from
+    `cache` (the module-wide AttachmentCache by default) and are joined into the output in one pass.
+
+    attachments: list of file paths (strings). Files will be attached if found; missing files are skipped.
+    headers: optional extra headers, e.g. {'Message-ID': ...}.
+    policy: email policy to serialize with; pass email.policy.SMTP for CRLF line endings on the wire.
+    """
+    cache = cache or _attachment_cache
+    parts = []
+    for attachment in attachments or []:
+        path = _resolve_attachment(attachment)
+        if path:
+            parts.append(cache.get(path, policy))
+
+    # Create a multipart message container
+    message = MIMEMultipart()
+    message['to'] = to
+    message['from'] = sender
+    message['subject'] = subject
+    for name, value in (headers or {}).items():
+        message[name] = value
+    boundary = '===============' + uuid.uuid4().hex + '=='
+    message.set_boundary(boundary)
+
+    # Attach the body as plain text
+    message.attach(MIMEText(message_text, 'plain', 'utf-8'))
+    if not parts:
+        return message.as_bytes(policy=policy)
+
+    # Splice the cached attachment parts in before the closing boundary
+    head = message.as_bytes(policy=policy)
+    linesep = policy.linesep.encode()
+    close_at = head.rindex(b'--' + boundary.encode() + b'--')
+    chunks = [head[:close_at]]
+    for part in parts:
+        chunks += [b'--' + boundary.encode() + linesep, part, linesep]
+    chunks.append(head[close_at:])
+    return b''.join(chunks)
+
+def create_message(sender, to, subject, message_text, attachments=None):
+    """Create a MIME message (see build_message_bytes) and return a dict with a base64url 'raw' string."""
+    raw = base64.urlsafe_b64encode(build_message_bytes(sender, to, subject, message_text, attachments)).decode('ascii')
     return {'raw': raw}
 
 def send_message(service, user_id, message):
@@ -91,17 +180,235 @@ def send_message(service, user_id, message):
     except Exception as e:
         raise
 
-def send_emails(messages, sender="me"):
+def _is_transient(exc):
+    """Rate limiting (429), server errors (5xx) and dropped connections are worth retrying."""
+    status = getattr(getattr(exc, 'resp', None), 'status', None)
+    if status is not None:
+        return int(status) == 429 or int(status) >= 500
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+def _batch_uri(service):
+    # The client builds its batch URI from the discovery document, which ignores api_endpoint overrides
+    api_endpoint = os.getenv("GMAIL_API_ENDPOINT")
+    if api_endpoint:
+        return api_endpoint.rstrip('/') + '/batch/gmail/v1'
+    return None
+
+def send_batch(service, user_id, items, bucket=None, max_retries=4):
     """
-    messages: list of dicts { 'to': email, 'subject': subject, 'body': body }
-    This function authenticates once and sends all messages.
+    Send `items` (list of (to, raw_message) pairs) through Gmail batch HTTP requests, re-batching
+    only the messages that failed with a transient error, with jittered exponential backoff. With a
+    `bucket`, each request holds at most `bucket.capacity` sends and is executed once the bucket has
+    a token for each, so the server sees the paced rate rather than one burst per batch.
+    Returns one result record per item, in order: {to, ok, id, error, attempts}.
     """
-    service = gmail_authenticate()
-    results = []
-    for msg in messages:
-        # Allow messages to optionally include an 'attachments' list of file paths
-        attachments = msg.get('attachments') or []
-        raw = create_message(sender, msg['to'], msg['subject'], msg['body'], attachments=attachments)
-        sent = send_message(service, sender, raw)
-        results.append(sent)
+    results = [None] * len(items)
+    pending = list(range(len(items)))
+    batch_uri = _batch_uri(service)
+    started = time.perf_counter()
+    attempt = 0
+    while pending:
+        attempt += 1
+        retry = []
+
+        def callback(request_id, response, exception):
+            i = int(request_id)
+            if exception is None:
+                results[i] = {'to': items[i][0], 'ok': True, 'id': response.get('id'), 'error': None, 'attempts': attempt}
+            elif _is_transient(exception) and attempt <= max_retries:
+                retry.append(i)
+            else:
+                results[i] = {'to': items[i][0], 'ok': False, 'id': None, 'error': str(exception), 'attempts': attempt}
+
+        # the server counts every send when the batch request arrives, so a request carries no more
+        # sends than the bucket has tokens for and goes out as soon as it has them
+        step = max(1, int(bucket.capacity)) if bucket is not None else len(pending)
+        for start in range(0, len(pending), step):
+            group = pending[start:start + step]
+            if batch_uri:
+                batch = BatchHttpRequest(callback=callback, batch_uri=batch_uri)
+            else:
+                batch = service.new_batch_http_request(callback=callback)
+            for i in group:
+                batch.add(service.users().messages().send(userId=user_id, body=items[i][1]), request_id=str(i))
+            if bucket is not None:
+                bucket.acquire(len(group))
+            try:
+                batch.execute()
+            except Exception as e:
+                # the whole batch request failed; anything without a result is retried or marked failed
+                unresolved = [i for i in group if results[i] is None and i not in retry]
+                if attempt <= max_retries and (_is_transient(e) or isinstance(e, OSError)):
+                    retry.extend(unresolved)
+                else:
+                    for i in unresolved:
+                        results[i] = {'to': items[i][0], 'ok': False, 'id': None, 'error': str(e), 'attempts': attempt}
+        pending = sorted(retry)
+        if pending:
+            time.sleep(jittered_delay(attempt - 1))
+    metrics.observe("send.gmail_batch", time.perf_counter() - started, error=not all(r['ok'] for r in results))
+    _count_results("gmail", results)
     return results
+
+def _count_results(transport, results):
+    for result in results:
+        metrics.incr("emails", transport=transport, result="sent" if result['ok'] else "failed")
+
+class GmailTransport:
+    """Delivers through the Gmail REST API, in batch requests paced to the per-user send quota."""
+    def __init__(self, service=None, batch_size=BATCH_SIZE, sends_per_second=SENDS_PER_SECOND, max_retries=4):
+        self.service = service or gmail_authenticate()
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate=sends_per_second, capacity=max(1, int(sends_per_second)))
+
+    def send_all(self, messages, sender="me"):
+        results = []
+        items = []
+        for msg in messages:
+            # Allow messages to optionally include an 'attachments' list of file paths
+            attachments = msg.get('attachments') or []
+            raw = create_message(sender, msg['to'], msg['subject'], msg['body'], attachments=attachments)
+            items.append((msg['to'], raw))
+            if len(items) >= self.batch_size:
+                results.extend(send_batch(self.service, sender, items, self.bucket, self.max_retries))
+                items = []
+        if items:
+            results.extend(send_batch(self.service, sender, items, self.bucket, self.max_retries))
+        return results
+
+    def close(self):
+        pass
+
+class SmtpTransport:
+    """
+    Delivers through an SMTP relay over a small pool of persistent connections.
+
+    Up to `pool_size` messages are in flight at once, each on its own connection; connections are
+    returned to the pool after a send and reused for the next message. A dropped connection is
+    discarded and the message retried on a fresh one; 4xx replies are retried with backoff, 5xx
+    replies fail the message. Settings default to the SMTP_* environment variables.
+    """
+    def __init__(self, host=None, port=None, username=None, password=None, starttls=None,
+                 pool_size=4, max_retries=3, timeout=30, chunk_size=100):
+        self.host = host or os.getenv("SMTP_HOST", "localhost")
+        self.port = int(port or os.getenv("SMTP_PORT", 587))
+        self.username = username if username is not None else os.getenv("SMTP_USERNAME")
+        self.password = password if password is not None else os.getenv("SMTP_PASSWORD")
+        if starttls is None:
+            starttls = os.getenv("SMTP_STARTTLS", "1").lower() in ("1", "true", "yes")
+        self.starttls = starttls
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._idle = queue.LifoQueue()
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+        except Exception:
+            self._discard(smtp)
+            raise
+        return smtp
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _discard(self, smtp):
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+    def _send_one(self, sender, msg):
+        started = time.perf_counter()
+        result = self._deliver(sender, msg)
+        metrics.observe("send.smtp", time.perf_counter() - started, error=not result['ok'])
+        _count_results("smtp", [result])
+        return result
+
+    def _deliver(self, sender, msg):
+        to = msg['to']
+        message_id = make_msgid()
+        data = build_message_bytes(sender, to, msg['subject'], msg['body'],
+                                   attachments=msg.get('attachments') or [], headers={'Message-ID': message_id},
+                                   policy=email_policy.SMTP)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            smtp = None
+            try:
+                smtp = self._checkout()
+                smtp.sendmail(sender, [to], data)
+                self._idle.put(smtp)
+                return {'to': to, 'ok': True, 'id': message_id, 'error': None, 'attempts': attempt + 1}
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                error = str(e)
+                # smtp is None when connecting or logging in failed: nothing to keep, retry on a new connection
+                if smtp is not None:
+                    # the server answered, so the connection is still good
+                    self._idle.put(smtp)
+                    if isinstance(e, smtplib.SMTPRecipientsRefused):
+                        code = next(iter(e.recipients.values()))[0]
+                    else:
+                        code = e.smtp_code
+                    if not 400 <= code < 500:
+                        return {'to': to, 'ok': False, 'id': None, 'error': error, 'attempts': attempt + 1}
+            except (smtplib.SMTPException, OSError) as e:
+                if smtp is not None:
+                    self._discard(smtp)
+                error = str(e)
+            if attempt < self.max_retries:
+                time.sleep(jittered_delay(attempt))
+        return {'to': to, 'ok': False, 'id': None, 'error': error, 'attempts': self.max_retries + 1}
+
+    def send_all(self, messages, sender=None):
+        if not sender or sender == "me":
+            sender = os.getenv("SMTP_SENDER") or self.username
+        results = []
+        with ThreadPoolExecutor(max_workers=self.pool_size) as pool:
+            chunk = []
+            for msg in messages:
+                chunk.append(msg)
+                if len(chunk) >= self.chunk_size:
+                    results.extend(pool.map(lambda m: self._send_one(sender, m), chunk))
+                    chunk = []
+            if chunk:
+                results.extend(pool.map(lambda m: self._send_one(sender, m), chunk))
+        return results
+
+    def close(self):
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                smtp.quit()
+            except Exception:
+                self._discard(smtp)
+
+TRANSPORTS = {"gmail": GmailTransport, "smtp": SmtpTransport}
+
+def send_emails(messages, sender="me", transport=None):
+    """
+    messages: iterable of dicts { 'to': email, 'subject': subject, 'body': body, 'attachments': [paths] }
+    transport: a transport instance, or the name of one in TRANSPORTS; defaults to $MAIL_TRANSPORT or "gmail".
+    Every transport authenticates/connects once for the run and returns one result record per message:
+    { 'to', 'ok', 'id', 'error', 'attempts' }. A failed message does not stop the rest.
+    """
+    owned = not hasattr(transport, 'send_all')
+    if owned:
+        transport = TRANSPORTS[transport or os.getenv("MAIL_TRANSPORT", "gmail")]()
+    try:
+        return transport.send_all(messages, sender)
+    finally:
+        if owned:
+            transport.close()
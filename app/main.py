@@ -1,35 +1,110 @@
-import uuid, json
-import streamlit as st
-from langchain_community.document_loaders import WebBaseLoader
-
+import json
 import os
-import csv
+import time
 import streamlit as st
-from langchain_community.document_loaders import WebBaseLoader
 
-from chains import Chain
-from portfolio import Portfolio
-from utils import clean_text
-from mailmerge import send_emails
-from ResumeEditor import Resume
+from utils import RateLimiter, clean_text, stream_concurrently
+from contacts import iter_contacts
+from drafts import DraftStore
+from metrics import metrics
+from resume_selector import SELECTION_MODES
+
+# Heavy dependencies (langchain, chromadb/pandas, the Gmail client, the LaTeX renderer) are imported
+# where they are first used, and the shared objects below are built once per process on first use,
+# so the first paint of the page does not wait for them.
+
+
+@st.cache_resource
+def get_chain():
+    from chains import Chain
+    return Chain()
+
+
+@st.cache_resource
+def get_portfolio():
+    from portfolio import Portfolio
+    return Portfolio()
+
+
+@st.cache_resource
+def get_draft_store():
+    return DraftStore()
+
 
+@st.cache_resource
+def get_render_store():
+    from render_store import RenderStore
+    return RenderStore()
 
-def create_streamlit_app(llm: Chain, portfolio, clean_text):
+
+@st.cache_resource
+def get_metrics_server():
+    # Prometheus can scrape http://127.0.0.1:$METRICS_PORT/metrics while the app runs
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    try:
+        return metrics.serve(int(port))
+    except OSError as e:
+        st.warning(f"Metrics endpoint not started on port {port}: {e}")
+        return None
+
+
+def show_metrics(placeholder):
+    """Per-stage timings and counters recorded so far in this process."""
+    snapshot = metrics.snapshot()
+    with placeholder.container():
+        st.subheader("Pipeline metrics")
+        if not snapshot["stages"] and not snapshot["counters"]:
+            st.caption("Nothing measured yet.")
+            return
+        st.dataframe([{"stage": name, **stage} for name, stage in snapshot["stages"].items()], hide_index=True)
+        st.dataframe([{"counter": c["name"], "labels": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+                       "value": c["value"]} for c in snapshot["counters"]], hide_index=True)
+
+
+def create_streamlit_app(get_llm, get_portfolio, clean_text):
+    """`get_llm` / `get_portfolio` return the shared Chain / Portfolio; they are only called when needed."""
     st.title("📧 Automate generating & sending mails")
-    url_input = st.text_input("Enter a URL:", value="https://jobs.cisco.com/jobs/ProjectDetail/Software-Engineer-C-Programming-and-Networking-5-to-9-Yrs-Chennai-Bangalore/1443134")
+    get_metrics_server()
+    metrics_panel = st.sidebar.empty()
+    urls_input = st.text_area("Enter job URLs (one per line):", value="https://jobs.cisco.com/jobs/ProjectDetail/Software-Engineer-C-Programming-and-Networking-5-to-9-Yrs-Chennai-Bangalore/1443134")
+    urls_file = st.file_uploader("...or upload a file of URLs", type=["txt", "csv"])
+    email_parallelism = st.number_input("Emails written in parallel:", min_value=1, max_value=32, value=6)
     submit_button = st.button("Submit")
 
     if submit_button:
         try:
-            loader = WebBaseLoader([url_input])
-            data = clean_text(loader.load().pop().page_content)
+            from scraper import parse_urls, scrape_pipeline
+            llm, portfolio = get_llm(), get_portfolio()
+            urls = parse_urls(urls_input + "\n" + (urls_file.getvalue().decode("utf-8", errors="ignore") if urls_file else ""))
             portfolio.load_portfolio()
-            jobs = llm.extract_jobs(data)
-            for job in jobs:
-                skills = job.get('skills', [])
-                links = portfolio.query_links(skills)
-                email = llm.write_mail(job, links)
-                st.code(email, language='markdown')
+            # a 429 on any email stream pauses all of them instead of each one tripping the limit in turn
+            limiter = RateLimiter()
+            # pages are fetched concurrently and each one is cleaned and sent to the LLM as soon as it arrives
+            for page, jobs, error in scrape_pipeline(urls, lambda text: llm.extract_jobs(clean_text(text))):
+                st.subheader(page["url"])
+                if error:
+                    st.error(f"An Error Occurred: {error}")
+                    continue
+                links_per_job = portfolio.query_links_many([job.get('skills', []) for job in jobs])
+                # all emails of the page are written concurrently and streamed into their own slot
+                placeholders = [st.empty() for _ in jobs]
+                texts = [""] * len(jobs)
+                last_paint = [0.0] * len(jobs)
+                streams = [lambda job=job, links=links: llm.stream_mail(job, links, limiter)
+                           for job, links in zip(jobs, links_per_job)]
+                for i, kind, value in stream_concurrently(streams, max_workers=int(email_parallelism)):
+                    if kind == "error":
+                        placeholders[i].error(f"An Error Occurred: {value}")
+                        continue
+                    if kind == "chunk":
+                        texts[i] += value
+                    # repainting on every token is slower than the model, so repaint at most every 50ms
+                    if kind == "done" or time.monotonic() - last_paint[i] >= 0.05:
+                        placeholders[i].code(texts[i], language='markdown')
+                        last_paint[i] = time.monotonic()
+                show_metrics(metrics_panel)
         except Exception as e:
             st.error(f"An Error Occurred: {e}")
 
@@ -37,6 +112,17 @@ def create_streamlit_app(llm: Chain, portfolio, clean_text):
 
     st.header("Mail-Merge: generate & send personalised mails from CSV")
     role_input = st.text_input("Role you are applying for (used to craft emails):", value="Software Engineer")
+    parallelism = st.number_input("Contacts processed in parallel:", min_value=1, max_value=32, value=4)
+    rpm_limit = st.number_input("Max LLM requests per minute (0 = unlimited):", min_value=0, value=0)
+    default_selection = os.getenv("RESUME_SELECTION", "llm")
+    selection_mode = st.selectbox("Pick resume projects/experience with:", SELECTION_MODES,
+                                  index=SELECTION_MODES.index(default_selection) if default_selection in SELECTION_MODES else 0,
+                                  help="llm: ask the model; local: vector similarity only, no LLM call; "
+                                       "hybrid: the model reranks a local shortlist")
+    transports = ["gmail", "smtp"]
+    default_transport = os.getenv("MAIL_TRANSPORT", "gmail")
+    transport = st.selectbox("Send via:", transports,
+                             index=transports.index(default_transport) if default_transport in transports else 0)
     generate_btn = st.button("Generate Mails")
     send_btn = st.button("Send Mails")
 
@@ -44,90 +130,90 @@ def create_streamlit_app(llm: Chain, portfolio, clean_text):
     base_dir = os.path.dirname(__file__)
     csv_file = os.path.join(base_dir, "test-mailmerge.csv")  # change path if needed
 
-    # ensure portfolio loaded
-    portfolio.load_portfolio()
-
-    # Initialize session_state container
-    if "generated_mails" not in st.session_state:
-        st.session_state.generated_mails = []  # list of dicts: {name,email,company,subject,body}
+    drafts = get_draft_store()
+    # Only the id of the current batch lives in the session; the drafts themselves are in the DraftStore
+    if "draft_batch" not in st.session_state:
+        st.session_state.draft_batch = None
 
     # Generate drafts
     if generate_btn:
         if not os.path.exists(csv_file):
             st.error(f"CSV not found at {csv_file}. Place test-mailmerge.csv there (columns: name,email,company).")
         else:
-            st.session_state.generated_mails = []
-            with open(csv_file, newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    name = row.get("name", "there")
-                    company = row.get("company", "")
-                    email = row.get("email")
-                    if not email:
-                        continue
-                    # query portfolio links using role (simple: treat role as a skill query)
-                    links = portfolio.query_links([role_input])
-                    # create subject & body using chains helper
-                    with open("data/resume.json", "r") as f:
-                        resume_data = json.load(f)
-                    subject = f"Regarding {role_input} opportunities at {company}"
-                    resume_file = "_".join(resume_data.get("name", "").split()) + "_" + uuid.uuid4().hex + ".pdf"
-                    try:
-                        body = llm.write_application_email_for_role(name, company, role_input, links)
-                        llm_data = llm.extract_projects_and_experiences(company, role_input)
-                        resume = Resume(
-                            education=resume_data.get("education", []),
-                            experience=llm_data.get("experience", []),
-                            projects=llm_data.get("projects", []),
-                            skills=resume_data.get("skills", {}),
-                            name=resume_data.get("name", ""),
-                            phone=resume_data.get("contact", {}).get("phone", ""),
-                            email=resume_data.get("contact", {}).get("email", ""),
-                            linkedin=resume_data.get("contact", {}).get("linkedin", ""),
-                            github=resume_data.get("contact", {}).get("github", "")
-                        )
-                        resume.generate_full_resume_pdf(resume_file)
-                    except Exception as e:
-                        body = f"Could not generate email due to: {e}"
-                    st.session_state.generated_mails.append({
-                        "name": name, "email": email, "company": company,
-                        "subject": subject, "body": body, "resume_file": resume_file
-                    })
-            st.success(f"Generated {len(st.session_state.generated_mails)} drafts.")
-
-    # Show generated drafts
-    if st.session_state.generated_mails:
-        st.subheader("Generated drafts")
-        for i, m in enumerate(st.session_state.generated_mails):
+            from generator import generate_drafts
+            llm, portfolio = get_llm(), get_portfolio()
+            # ensure portfolio loaded
+            portfolio.load_portfolio()
+            # the previous drafts no longer need their PDFs
+            store = get_render_store()
+            if st.session_state.draft_batch:
+                for m in drafts.iter_drafts(st.session_state.draft_batch):
+                    if m.get('resume_file'):
+                        store.release(m['resume_file'])
+                drafts.delete_batch(st.session_state.draft_batch)
+            store.evict()
+            batch_id = drafts.new_batch()
+            st.session_state.draft_batch = batch_id
+            progress = st.empty()
+            stats = {}
+            contacts = (row for chunk in iter_contacts(csv_file, stats=stats) for row in chunk)
+            generated = 0
+            for draft in generate_drafts(llm, portfolio, contacts, role_input, max_workers=int(parallelism),
+                                         max_requests_per_minute=int(rpm_limit), store=store,
+                                         selection_mode=selection_mode):
+                drafts.add(batch_id, draft)
+                generated += 1
+                progress.info(f"Generated {generated} drafts so far... latest: {draft['email']}")
+                if generated % 10 == 0:
+                    show_metrics(metrics_panel)
+            progress.empty()
+            st.success(f"Generated {generated} drafts.")
+            if stats.get("invalid") or stats.get("duplicates"):
+                st.warning(f"Skipped {stats['invalid']} rows with invalid emails and {stats['duplicates']} duplicate emails.")
+
+    # Show generated drafts, one page at a time
+    batch_id = st.session_state.draft_batch
+    total = drafts.count(batch_id) if batch_id else 0
+    if total:
+        st.subheader(f"Generated drafts ({total})")
+        page_size = 20
+        pages = (total + page_size - 1) // page_size
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+        for m in drafts.page(batch_id, offset=(page - 1) * page_size, limit=page_size):
             with st.expander(f"{m['name']} — {m['company']} ({m['email']})", expanded=False):
                 st.write("Subject:", m['subject'])
                 st.code(m['body'], language='markdown')
 
     # Send mails
     if send_btn:
-        if not st.session_state.generated_mails:
+        if not total:
             st.error("No generated mails to send. Click 'Generate Mails' first.")
         else:
             try:
-                # Prepare messages in the shape mailmerge.send_emails expects
-                messages = []
-                for m in st.session_state.generated_mails:
-                    messages.append({
-                        "to": m['email'],
-                        "subject": m['subject'],
-                        "body": m['body'],
-                        "attachments": ['pdfs/' + m['resume_file']] if m.get('resume_file') else []
-                    })
-                results = send_emails(messages)
-                st.success(f"Sent {len(results)} emails.")
-                st.write(results)
+                from mailmerge import send_emails
+                # Prepare messages in the shape mailmerge.send_emails expects, streamed from the draft store
+                messages = ({
+                    "to": m['email'],
+                    "subject": m['subject'],
+                    "body": m['body'],
+                    "attachments": ['pdfs/' + m['resume_file']] if m.get('resume_file') else []
+                } for m in drafts.iter_drafts(batch_id))
+                results = send_emails(messages, transport=transport)
+                sent = sum(1 for r in results if r['ok'])
+                st.success(f"Sent {sent} of {len(results)} emails.")
+                failed = [r for r in results if not r['ok']]
+                if failed:
+                    st.error(f"{len(failed)} emails could not be sent.")
+                    st.write(failed)
             except Exception as e:
                 st.error(f"Sending failed: {e}")
 
+    show_metrics(metrics_panel)
+    st.sidebar.download_button("Download metrics (JSON)", json.dumps(metrics.snapshot(), indent=2),
+                               file_name="metrics.json", mime="application/json")
+
 
 if __name__ == "__main__":
-    chain = Chain()
-    portfolio = Portfolio()
     st.set_page_config(layout="wide", page_title="Cold Email Generator", page_icon="📧")
-    create_streamlit_app(chain, portfolio, clean_text)
+    create_streamlit_app(get_chain, get_portfolio, clean_text)
 
@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket bounds in seconds, for the Prometheus output
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Stage:
+    def __init__(self, samples):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.recent = deque(maxlen=samples)
+
+    def observe(self, seconds, error):
+        self.count += 1
+        self.errors += bool(error)
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+    def percentile(self, q):
+        values = sorted(self.recent)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class Metrics:
+    """
+    In-process timings and counters for the pipeline.
+
+    `stage(name)` times a block (an exception counts as an error and is re-raised); `incr` bumps a
+    labelled counter, e.g. tokens or cache hits. Percentiles are computed over the last `samples`
+    observations of a stage. `snapshot()` is the JSON form, `prometheus()` the text exposition format.
+    """
+    def __init__(self, samples=1024, namespace="cold_email"):
+        self.samples = samples
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(name, time.perf_counter() - started, error=True)
+            raise
+        self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            if name not in self._stages:
+                self._stages[name] = _Stage(self.samples)
+            self._stages[name].observe(seconds, error)
+
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {
+                name: {
+                    "count": s.count, "errors": s.errors, "total_s": round(s.total, 3),
+                    "mean_ms": round(s.total / s.count * 1000, 1) if s.count else 0.0,
+                    "p50_ms": round(s.percentile(50) * 1000, 1), "p95_ms": round(s.percentile(95) * 1000, 1),
+                    "max_ms": round(s.max * 1000, 1),
+                }
+                for name, s in sorted(self._stages.items())
+            }
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {"stages": stages, "counters": counters}
+
+    def prometheus(self) -> str:
+        ns = self.namespace
+        lines = [f"# TYPE {ns}_stage_seconds histogram"]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for name, s in stages:
+                for bound, count in zip(BUCKETS, s.buckets):
+                    lines.append(f'{ns}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'{ns}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {s.count}')
+                lines.append(f'{ns}_stage_seconds_sum{{stage="{name}"}} {s.total:.6f}')
+                lines.append(f'{ns}_stage_seconds_count{{stage="{name}"}} {s.count}')
+            lines.append(f"# TYPE {ns}_stage_errors_total counter")
+            lines.extend(f'{ns}_stage_errors_total{{stage="{name}"}} {s.errors}' for name, s in stages)
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {ns}_{name}_total counter")
+                    declared.add(name)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{ns}_{name}_total{{{label_text}}} {value}" if label_text else f"{ns}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """
+        Serve /metrics (Prometheus text) and /metrics.json on a background thread.
+        Returns the server; call .shutdown() to stop it.
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# the process-wide registry every module records into
+metrics = Metrics()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import HRFlowable, ListFlowable, ListItem, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+# Standard PDF fonts: no font files to ship, and the text layer is plain extractable text for ATS parsers
+FONT, BOLD, ITALIC = "Helvetica", "Helvetica-Bold", "Helvetica-Oblique"
+
+STYLES = {
+    "name": ParagraphStyle("name", fontName=BOLD, fontSize=22, leading=26, alignment=TA_CENTER),
+    "contact": ParagraphStyle("contact", fontName=FONT, fontSize=9.5, leading=12, alignment=TA_CENTER),
+    "section": ParagraphStyle("section", fontName=BOLD, fontSize=12, leading=14, spaceBefore=8),
+    "left": ParagraphStyle("left", fontName=BOLD, fontSize=10.5, leading=13),
+    "right": ParagraphStyle("right", fontName=FONT, fontSize=10.5, leading=13, alignment=2),
+    "left_sub": ParagraphStyle("left_sub", fontName=ITALIC, fontSize=9.5, leading=12),
+    "right_sub": ParagraphStyle("right_sub", fontName=ITALIC, fontSize=9.5, leading=12, alignment=2),
+    "item": ParagraphStyle("item", fontName=FONT, fontSize=9.5, leading=12),
+    "skills": ParagraphStyle("skills", fontName=FONT, fontSize=9.5, leading=13),
+}
+
+MARGIN = 0.5 * inch
+TEXT_WIDTH = letter[0] - 2 * MARGIN
+_SUBHEADING_STYLE = TableStyle([
+    ("LEFTPADDING", (0, 0), (-1, -1), 0), ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+    ("TOPPADDING", (0, 0), (-1, -1), 0), ("BOTTOMPADDING", (0, 0), (-1, -1), 1),
+    ("VALIGN", (0, 0), (-1, -1), "BOTTOM"),
+])
+
+
+def _text(value):
+    return escape(str(value or ""))
+
+
+def _section(title):
+    return [Paragraph(title.upper(), STYLES["section"]),
+            HRFlowable(width="100%", thickness=0.6, color=colors.black, spaceBefore=1, spaceAfter=4)]
+
+
+def _subheading(top_left, top_right, bottom_left, bottom_right):
+    """Two lines with left- and right-aligned parts, like \\resumeSubheading. Arguments are markup."""
+    rows = [[Paragraph(top_left, STYLES["left"]), Paragraph(top_right, STYLES["right"])]]
+    if bottom_left or bottom_right:
+        rows.append([Paragraph(bottom_left, STYLES["left_sub"]), Paragraph(bottom_right, STYLES["right_sub"])])
+    return Table(rows, colWidths=[TEXT_WIDTH * 0.7, TEXT_WIDTH * 0.3], style=_SUBHEADING_STYLE)
+
+
+def _bullets(points):
+    items = [ListItem(Paragraph(_text(point), STYLES["item"]), leftIndent=12) for point in points or []]
+    return ListFlowable(items, bulletType="bullet", start="•", leftIndent=12, bulletFontSize=7) if items else None
+
+
+def resume_flowables(resume):
+    """The resume's sections, in the order and with the content of Resume.generate_full_resume_latex."""
+    contact = [_text(resume.phone)]
+    if resume.email:
+        contact.append(f'<link href="mailto:{_text(resume.email)}">{_text(resume.email)}</link>')
+    if resume.linkedin:
+        contact.append(f'<link href="https://www.linkedin.com/in/{_text(resume.linkedin)}">'
+                       f'linkedin.com/in/{_text(resume.linkedin)}</link>')
+    if resume.github:
+        contact.append(f'<link href="https://github.com/{_text(resume.github)}">github.com/{_text(resume.github)}</link>')
+    story = [Paragraph(_text(resume.name), STYLES["name"]),
+             Paragraph(" &nbsp;|&nbsp; ".join(c for c in contact if c), STYLES["contact"]), Spacer(1, 4)]
+
+    story += _section("Education")
+    for edu in resume.education:
+        story.append(_subheading(_text(edu.get("institution")), _text(edu.get("duration")),
+                                 _text(edu.get("degree")), f"GPA: {_text(edu.get('grade'))}"))
+
+    story += _section("Experience")
+    for exp in resume.experience:
+        story.append(_subheading(_text(exp.get("organization")), _text(exp.get("duration")),
+                                 _text(exp.get("role")), _text(exp.get("location"))))
+        story.append(_bullets(exp.get("description")))
+
+    story += _section("Projects")
+    for proj in resume.projects:
+        technologies = ", ".join(_text(tech) for tech in proj.get("technologies") or [])
+        story.append(Paragraph(f"<b>{_text(proj.get('name'))}</b> | <i>{technologies}</i>", STYLES["left"]))
+        story.append(_bullets(proj.get("description")))
+
+    story += _section("Skills")
+    for category, skills_list in (resume.skills or {}).items():
+        story.append(Paragraph(f"<b>{_text(category)}</b>: {', '.join(_text(s) for s in skills_list)}", STYLES["skills"]))
+    return [flowable for flowable in story if flowable is not None]
+
+
+def render_resume_pdf(resume, output_path, output_dir="pdfs"):
+    """Lay the resume out with reportlab and write it to `output_dir/output_path`; returns the path."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, output_path)
+    # built next to the target and renamed into place, so a half-written PDF is never picked up
+    fd, partial = tempfile.mkstemp(dir=output_dir, suffix=".pdf.part")
+    os.close(fd)
+    doc = SimpleDocTemplate(partial, pagesize=letter, leftMargin=MARGIN, rightMargin=MARGIN,
+                            topMargin=MARGIN, bottomMargin=MARGIN, title=f"{resume.name} - Resume",
+                            author=resume.name)
+    try:
+        doc.build(resume_flowables(resume))
+        os.replace(partial, path)
+    except BaseException:
+        os.remove(partial)
+        raise
+    return path
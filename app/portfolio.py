@@ -1,21 +1,117 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 import pandas as pd
 import chromadb
-import uuid
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+from metrics import metrics
 
 
 class Portfolio:
-    def __init__(self, file_path="app/resource/portfolio.csv"):
+    def __init__(self, file_path="app/resource/portfolio.csv", query_cache_size=4096):
         self.file_path = file_path
         self.data = pd.read_csv(file_path)
+        self._data_mtime = os.path.getmtime(file_path)
+        self._synced_mtime = None
+        self.embedding_function = DefaultEmbeddingFunction()
         self.chroma_client = chromadb.PersistentClient('vectorstore')
-        self.collection = self.chroma_client.get_or_create_collection(name="portfolio")
+        self.collection = self.chroma_client.get_or_create_collection(name="portfolio", embedding_function=self.embedding_function)
+        self.query_cache_size = query_cache_size
+        self._query_embeddings = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @staticmethod
+    def row_id(techstack, links):
+        """Deterministic id from the row content, so an edited row shows up as a new id."""
+        return hashlib.sha1(f"{techstack}\x1f{links}".encode("utf-8")).hexdigest()
 
     def load_portfolio(self):
-        if not self.collection.count():
-            for _, row in self.data.iterrows():
-                self.collection.add(documents=row["Techstack"],
-                                    metadatas={"links": row["Links"]},
-                                    ids=[str(uuid.uuid4())])
-
-    def query_links(self, skills):
-        return self.collection.query(query_texts=skills, n_results=2).get('metadatas', [])
\ No newline at end of file
+        """
+        Sync the collection with the CSV: rows that are new or changed are embedded and upserted in
+        batches, rows no longer in the CSV are deleted, and unchanged rows are left alone.
+        Does nothing if the CSV has not been modified since the last sync.
+        """
+        mtime = os.path.getmtime(self.file_path)
+        if mtime == self._synced_mtime:
+            return
+        if mtime != self._data_mtime:
+            self.data = pd.read_csv(self.file_path)
+            self._data_mtime = mtime
+
+        rows = {}
+        for techstack, links in zip(self.data["Techstack"], self.data["Links"]):
+            rows[self.row_id(techstack, links)] = (techstack, links)
+        existing = set(self.collection.get(include=[])["ids"])
+
+        batch_size = self.chroma_client.get_max_batch_size()
+        removed = [row_id for row_id in existing if row_id not in rows]
+        for start in range(0, len(removed), batch_size):
+            self.collection.delete(ids=removed[start:start + batch_size])
+        added = [row_id for row_id in rows if row_id not in existing]
+        for start in range(0, len(added), batch_size):
+            ids = added[start:start + batch_size]
+            self.collection.upsert(documents=[rows[row_id][0] for row_id in ids],
+                                   metadatas=[{"links": rows[row_id][1]} for row_id in ids],
+                                   ids=ids)
+        self._synced_mtime = mtime
+
+    @staticmethod
+    def normalize_skill(skill):
+        # the default embedding model is uncased, so case and spacing do not change the vector
+        return " ".join(str(skill).lower().split())
+
+    def embed_queries(self, texts):
+        """
+        Embeddings for `texts` (already normalized), served from an in-memory LRU cache.
+        Texts not in the cache are embedded together in a single call.
+        """
+        with self._cache_lock:
+            missing = [t for t in dict.fromkeys(texts) if t not in self._query_embeddings]
+        metrics.incr("embedding_cache", len(texts) - len(missing), result="hit")
+        metrics.incr("embedding_cache", len(missing), result="miss")
+        if missing:
+            with metrics.stage("portfolio.embed"):
+                vectors = self.embedding_function(missing)
+            with self._cache_lock:
+                for text, vector in zip(missing, vectors):
+                    self._query_embeddings[text] = vector
+                while len(self._query_embeddings) > self.query_cache_size:
+                    self._query_embeddings.popitem(last=False)
+        with self._cache_lock:
+            result = []
+            for text in texts:
+                if text not in self._query_embeddings:
+                    # evicted by a concurrent caller in the meantime
+                    self._query_embeddings[text] = self.embedding_function([text])[0]
+                self._query_embeddings.move_to_end(text)
+                result.append(self._query_embeddings[text])
+            return result
+
+    def query_links_many(self, skill_lists, n_results=2):
+        """
+        Resolve portfolio links for several skill lists (e.g. one per job) with one vector query.
+        Returns one flat, de-duplicated list of links per input list, most relevant first.
+        """
+        skill_lists = [[skills] if isinstance(skills, str) else list(skills or []) for skills in skill_lists]
+        unique = list(dict.fromkeys(self.normalize_skill(s) for skills in skill_lists for s in skills if str(s).strip()))
+        if not unique:
+            return [[] for _ in skill_lists]
+        embeddings = self.embed_queries(unique)
+        with metrics.stage("portfolio.query"):
+            res = self.collection.query(query_embeddings=embeddings, n_results=n_results)
+        links_by_skill = {
+            skill: [m["links"] for m in metadatas if m and m.get("links")]
+            for skill, metadatas in zip(unique, res.get('metadatas') or [])
+        }
+        results = []
+        for skills in skill_lists:
+            links = []
+            for skill in skills:
+                links.extend(links_by_skill.get(self.normalize_skill(skill), []))
+            results.append(list(dict.fromkeys(links)))
+        return results
+
+    def query_links(self, skills, n_results=2):
+        """Flat, de-duplicated list of portfolio links matching `skills`."""
+        return self.query_links_many([skills], n_results=n_results)[0]
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from ResumeEditor import default_renderer
+from metrics import metrics
+
+
+class RenderStore:
+    """
+    Content-addressed store of rendered resume PDFs.
+
+    A PDF is named after Resume.content_hash(), so two drafts whose tailored resume is identical
+    share one file and one compile. Each draft that uses a PDF holds a reference; `release` drops
+    it, and `evict` deletes unreferenced PDFs beyond `max_unreferenced`, least recently used first.
+    """
+    def __init__(self, output_dir="pdfs", index_path=".cache/render_store.sqlite", max_unreferenced=200, renderer=None):
+        """`renderer` is "latex" or "reportlab" (see ResumeEditor.RENDERERS); defaults to $RESUME_RENDERER or "latex"."""
+        if os.path.dirname(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.output_dir = output_dir
+        self.renderer = renderer or default_renderer()
+        self.max_unreferenced = max_unreferenced
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "digest TEXT PRIMARY KEY, file_name TEXT NOT NULL, refs INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @contextmanager
+    def _digest_lock(self, digest):
+        """Hold the per-digest lock; the entry is dropped once no thread is rendering or waiting on it."""
+        with self._lock:
+            entry = self._inflight.setdefault(digest, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._inflight[digest]
+
+    def get_or_render(self, resume, name_prefix="resume", compiler=None) -> str:
+        """
+        Return the file name (relative to output_dir) of the PDF for `resume`, compiling it only if
+        no PDF with the same content hash exists yet. Takes a reference on the artifact.
+        """
+        digest = resume.content_hash(self.renderer)
+        file_name = f"{name_prefix}_{digest[:16]}.pdf"
+        # rows rendering the same content wait for the first compile instead of starting their own
+        with self._digest_lock(digest):
+            if not os.path.exists(os.path.join(self.output_dir, file_name)):
+                metrics.incr("render_store", result="miss")
+                resume.generate_full_resume_pdf(file_name, output_dir=self.output_dir, compiler=compiler,
+                                                renderer=self.renderer)
+            else:
+                metrics.incr("render_store", result="hit")
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO artifacts (digest, file_name, refs, last_used) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT(digest) DO UPDATE SET refs = refs + 1, last_used = excluded.last_used",
+                    (digest, file_name, time.time())
+                )
+                self._conn.commit()
+        return file_name
+
+    def release(self, file_name):
+        with self._lock:
+            self._conn.execute("UPDATE artifacts SET refs = MAX(refs - 1, 0) WHERE file_name = ?", (file_name,))
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Delete unreferenced PDFs beyond `max_unreferenced`; returns how many were removed."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT digest, file_name FROM artifacts WHERE refs = 0 ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                (self.max_unreferenced,)
+            ).fetchall()
+            for digest, file_name in rows:
+                try:
+                    os.remove(os.path.join(self.output_dir, file_name))
+                except OSError:
+                    pass
+                self._conn.execute("DELETE FROM artifacts WHERE digest = ?", (digest,))
+            self._conn.commit()
+        return len(rows)
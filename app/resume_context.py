@@ -0,0 +1,112 @@
+import json
+import re
+import threading
+
+import numpy as np
+
+_WS_RE = re.compile(r"\s+")
+# LaTeX/markdown markup that only costs tokens in a prompt
+_MARKUP_RE = re.compile(r"[\\{}*_`#]+")
+
+
+def _plain(value):
+    if isinstance(value, (list, tuple)):
+        value = " ".join(_plain(v) for v in value if v)
+    return _WS_RE.sub(" ", _MARKUP_RE.sub("", str(value or ""))).strip()
+
+
+def estimate_tokens(text, chars_per_token=4):
+    return len(text) // chars_per_token + 1
+
+
+class CompactResume:
+    """
+    The projects and experience of a resume as one short line each, under short ids ("p1", "e1", ...).
+
+    The model is shown `prompt_text()` and answers with ids, which `rehydrate` turns back into the
+    full resume entries, so a prompt carries a few hundred tokens instead of the raw resume JSON.
+    `select_ids` keeps the prompt under a token budget, ranking entries by embedding similarity to
+    the role when an embedding function is given.
+    """
+    def __init__(self, resume_data: dict, embedding_function=None):
+        self.entries = {}
+        for i, project in enumerate(resume_data.get("projects", []), 1):
+            self.entries[f"p{i}"] = project
+        for i, job in enumerate(resume_data.get("experience", []), 1):
+            self.entries[f"e{i}"] = job
+        self.lines = {entry_id: self._summarize(entry_id, entry) for entry_id, entry in self.entries.items()}
+        self.embedding_function = embedding_function
+        self._vectors = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_json(cls, resume_text: str, embedding_function=None):
+        return cls(json.loads(resume_text), embedding_function)
+
+    @staticmethod
+    def _summarize(entry_id, entry):
+        if not isinstance(entry, dict):
+            return f"{entry_id}: {_plain(entry)}"
+        if entry_id.startswith("p"):
+            head = _plain(entry.get("name"))
+            if entry.get("technologies"):
+                head += f" [{', '.join(_plain(t) for t in entry['technologies'])}]"
+        else:
+            head = ", ".join(p for p in (_plain(entry.get("role")), _plain(entry.get("organization"))) if p)
+            if entry.get("duration"):
+                head += f" ({_plain(entry['duration'])})"
+        return f"{entry_id}: {head} - {_plain(entry.get('description'))}"
+
+    def prompt_text(self, ids=None) -> str:
+        ids = list(self.entries) if ids is None else ids
+        return "\n".join(self.lines[entry_id] for entry_id in ids)
+
+    def _entry_vectors(self):
+        with self._lock:
+            if self._vectors is None:
+                vectors = np.asarray(self.embedding_function(list(self.lines.values())), dtype=float)
+                self._vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            return self._vectors
+
+    def rank(self, query: str):
+        """Entry ids, most similar to `query` first; resume order without an embedding function."""
+        if self.embedding_function is None or not self.entries:
+            return list(self.entries)
+        query_vector = np.asarray(self.embedding_function([query])[0], dtype=float)
+        scores = self._entry_vectors() @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))
+        ids = list(self.entries)
+        return [ids[i] for i in np.argsort(-scores, kind="stable")]
+
+    def select_ids(self, query: str, max_tokens=None):
+        """
+        Ids to show the model for `query`, in resume order. With `max_tokens` set, entries are taken
+        best-ranked first while their lines fit in the budget.
+        """
+        if not max_tokens:
+            return list(self.entries)
+        chosen, used = set(), 0
+        for entry_id in self.rank(query):
+            cost = estimate_tokens(self.lines[entry_id])
+            if used + cost <= max_tokens:
+                chosen.add(entry_id)
+                used += cost
+        return [entry_id for entry_id in self.entries if entry_id in chosen]
+
+    def rehydrate(self, selection) -> dict:
+        """
+        Turn the model's {"projects": [ids], "experience": [ids]} into full resume entries.
+        Unknown ids are dropped and each id is routed by its prefix, so an id listed under the wrong key
+        still lands in the right section.
+        """
+        result = {"projects": [], "experience": []}
+        if not isinstance(selection, dict):
+            return result
+        seen = set()
+        for key in ("projects", "experience"):
+            for entry_id in selection.get(key) or []:
+                entry_id = str(entry_id.get("id") if isinstance(entry_id, dict) else entry_id).strip().lower()
+                if entry_id in self.entries and entry_id not in seen:
+                    seen.add(entry_id)
+                    section = "projects" if entry_id.startswith("p") else "experience"
+                    result[section].append(self.entries[entry_id])
+        return result
@@ -0,0 +1,59 @@
+import hashlib
+
+SELECTION_MODES = ["llm", "local", "hybrid"]
+
+
+class ResumeSelector:
+    """
+    Picks resume projects/experience for a role by vector similarity, without an LLM call.
+
+    Each entry of a CompactResume is embedded once into the "resume_entries" collection of the
+    portfolio's Chroma client (re-embedded only when its text changes); a selection is then one
+    query embedding and one nearest-neighbour lookup.
+    """
+    def __init__(self, portfolio, resume, collection_name="resume_entries"):
+        self.portfolio = portfolio
+        self.resume = resume
+        self.collection = portfolio.chroma_client.get_or_create_collection(
+            name=collection_name, embedding_function=portfolio.embedding_function
+        )
+        self._doc_ids = {}
+        self.sync()
+
+    @staticmethod
+    def doc_id(line):
+        return hashlib.sha1(line.encode("utf-8")).hexdigest()
+
+    def sync(self):
+        """Embed entries that are new or changed and drop the ones no longer in the resume."""
+        self._doc_ids = {self.doc_id(line): entry_id for entry_id, line in self.resume.lines.items()}
+        existing = set(self.collection.get(include=[])["ids"])
+        removed = [doc_id for doc_id in existing if doc_id not in self._doc_ids]
+        if removed:
+            self.collection.delete(ids=removed)
+        added = [doc_id for doc_id in self._doc_ids if doc_id not in existing]
+        if added:
+            self.collection.upsert(documents=[self.resume.lines[self._doc_ids[d]] for d in added], ids=added)
+
+    def rank(self, role, job_description=None):
+        """All entry ids, most similar to the role (and job description) first."""
+        if not self._doc_ids:
+            return []
+        query = self.portfolio.normalize_skill(f"{role} {job_description or ''}")
+        res = self.collection.query(query_embeddings=self.portfolio.embed_queries([query]),
+                                    n_results=len(self._doc_ids), include=[])
+        return [self._doc_ids[doc_id] for doc_id in res["ids"][0] if doc_id in self._doc_ids]
+
+    def shortlist(self, role, job_description=None, n_projects=4, n_experience=3):
+        """The best `n_projects` project ids and `n_experience` experience ids, most similar first."""
+        ranked = self.rank(role, job_description)
+        return [i for i in ranked if i.startswith("p")][:n_projects] + \
+            [i for i in ranked if i.startswith("e")][:n_experience]
+
+    def select(self, role, job_description=None, n_projects=3, n_experience=2) -> dict:
+        """
+        {"projects", "experience"} for the role, as extract_projects_and_experiences returns it.
+        Entries keep their resume order, so experience stays chronological.
+        """
+        chosen = set(self.shortlist(role, job_description, n_projects, n_experience))
+        return self.resume.rehydrate({"projects": [i for i in self.resume.entries if i in chosen]})
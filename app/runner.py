@@ -0,0 +1,243 @@
+"""
+Headless mail-merge: run a contacts CSV through generation, PDF rendering and sending as resumable
+stages, checkpointed per row in a SQLite journal (see journal.JobJournal).
+
+    python app/runner.py run --job nightly --csv contacts.csv --role "Software Engineer"
+    python app/runner.py run --job nightly                  # resume: only unfinished rows are processed
+    python app/runner.py run --job nightly --stages generate,render   # review before sending
+    python app/runner.py status --job nightly
+
+Re-running a job never calls the LLM for a row that already has its email, never re-renders a row
+that has its PDF and never re-sends a row recorded as sent. Rows that were being sent when a run died
+are left alone unless --resend-unconfirmed is given, since they may already have been delivered.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from contacts import iter_contacts
+from journal import GENERATED, PENDING, RENDERED, SENDING, SENT, JobJournal
+from ResumeEditor import RENDERERS
+from metrics import metrics
+from resume_selector import SELECTION_MODES
+from utils import RateLimiter, jittered_delay
+
+STAGES = ("generate", "render", "send")
+
+
+def _drain(journal, job_id, rows, pool, work, on_done, max_in_flight):
+    """Run `work(row)` on `pool` for every row with a bounded number in flight; `on_done(row, result)`."""
+    done_count = 0
+    pending = {}
+
+    def settle(futures):
+        nonlocal done_count
+        for future in futures:
+            row = pending.pop(future)
+            try:
+                on_done(row, future.result())
+            except Exception as e:
+                journal.fail(job_id, row["email"], e)
+            done_count += 1
+
+    for row in rows:
+        pending[pool.submit(work, row)] = row
+        if len(pending) >= max_in_flight:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            settle(done)
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        settle(done)
+    return done_count
+
+
+def run_generate(journal, job_id, options, ctx, row_pool, max_workers, max_attempts):
+    from generator import compose_draft
+
+    def on_done(row, composed):
+        journal.advance(job_id, row["email"], GENERATED, **composed)
+
+    return _drain(journal, job_id, journal.rows(job_id, PENDING, max_attempts), row_pool,
+                  lambda row: compose_draft(ctx, row, options["role"]), on_done, max_workers * 2)
+
+
+def run_render(journal, job_id, ctx, row_pool, max_workers, max_attempts):
+    from generator import render_draft
+
+    def on_done(row, resume_file):
+        journal.advance(job_id, row["email"], RENDERED, resume_file=resume_file)
+
+    return _drain(journal, job_id, journal.rows(job_id, GENERATED, max_attempts), row_pool,
+                  lambda row: render_draft(ctx, row["selection"]), on_done, max_workers * 2)
+
+
+def run_send(journal, job_id, transport, output_dir, max_attempts, chunk_size=50, store=None):
+    """
+    Send rendered rows `chunk_size` at a time. A chunk is marked "sending" before it is handed to the
+    transport and each row is marked sent (or failed and back to rendered) as soon as the chunk returns.
+    Failed rows come round again until they have used `max_attempts`; a chunk holding such retries
+    waits with jittered backoff first. A sent row's reference on its PDF in `store` (a RenderStore) is
+    released, so the PDF can be evicted.
+    """
+    if not max_attempts or max_attempts < 1:
+        raise ValueError("max_attempts must be at least 1")
+    sent = 0
+    while True:
+        chunk = []
+        for row in journal.rows(job_id, RENDERED, max_attempts, chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                break
+        if not chunk:
+            return sent
+        retry = max(row["attempts"] for row in chunk)
+        if retry:
+            time.sleep(jittered_delay(retry - 1))
+        journal.advance_many(job_id, [row["email"] for row in chunk], SENDING)
+        messages = [{
+            "to": row["email"],
+            "subject": row["subject"],
+            "body": row["body"],
+            "attachments": [os.path.join(output_dir, row["resume_file"])] if row["resume_file"] else []
+        } for row in chunk]
+        try:
+            results = transport.send_all(messages)
+        except Exception as e:
+            # nothing was confirmed, but some messages may have gone out; leave them in "sending"
+            for row in chunk:
+                journal.fail(job_id, row["email"], e)
+            raise
+        by_address = {r["to"]: r for r in results}
+        for row in chunk:
+            result = by_address.get(row["email"])
+            if result and result["ok"]:
+                journal.advance(job_id, row["email"], SENT, message_id=result["id"])
+                if store is not None and row["resume_file"]:
+                    store.release(row["resume_file"])
+                sent += 1
+            else:
+                journal.fail(job_id, row["email"], result["error"] if result else "no result from transport",
+                             status=RENDERED)
+
+
+def run_job(journal, job_id, options, stages=STAGES, max_workers=4, max_requests_per_minute=0,
+            max_attempts=3, transport_name=None, resend_unconfirmed=False, log=print):
+    """Run the requested stages of a job, in pipeline order, and return the journal counts."""
+    if max_attempts < 1:
+        raise ValueError("max_attempts must be at least 1")
+    from generator import GenerationContext
+    from latex_compiler import LatexCompilerPool
+    from render_store import RenderStore
+
+    if resend_unconfirmed:
+        journal.advance_many(job_id, [row["email"] for row in journal.rows(job_id, SENDING)], RENDERED)
+    store = RenderStore(renderer=options.get("renderer"))
+    with ThreadPoolExecutor(max_workers=max_workers) as row_pool, \
+            ThreadPoolExecutor(max_workers=max_workers) as llm_pool, \
+            LatexCompilerPool() as compiler:
+        if "generate" in stages:
+            from chains import Chain
+            from portfolio import Portfolio
+            portfolio = Portfolio()
+            portfolio.load_portfolio()
+            ctx = GenerationContext(Chain(), portfolio, llm_pool, RateLimiter(max_requests_per_minute), compiler,
+                                    store, selection_mode=options.get("selection_mode", "llm"),
+                                    max_resume_tokens=options.get("max_resume_tokens"))
+            count = run_generate(journal, job_id, options, ctx, row_pool, max_workers, max_attempts)
+            log(f"generate: processed {count} rows")
+        else:
+            ctx = GenerationContext(None, None, llm_pool, compiler=compiler, store=store)
+        if "render" in stages:
+            count = run_render(journal, job_id, ctx, row_pool, max_workers, max_attempts)
+            log(f"render: processed {count} rows")
+    if "send" in stages:
+        from mailmerge import TRANSPORTS
+        transport = TRANSPORTS[transport_name or os.getenv("MAIL_TRANSPORT", "gmail")]()
+        try:
+            count = run_send(journal, job_id, transport, store.output_dir, max_attempts, store=store)
+        finally:
+            transport.close()
+        store.evict()
+        log(f"send: sent {count} emails")
+    return journal.counts(job_id)
+
+
+def print_status(journal, job_id):
+    counts = journal.counts(job_id)
+    print(f"job {job_id}: " + ", ".join(f"{status} {count}" for status, count in counts.items()))
+    if counts[SENDING]:
+        print(f"{counts[SENDING]} rows were being sent when a run stopped; check the mailbox, then "
+              f"re-run with --resend-unconfirmed to send them again.")
+    for error in journal.errors(job_id):
+        print(f"  {error['email']} ({error['status']}, {error['attempts']} attempts): {error['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumable headless mail-merge")
+    parser.add_argument("--journal", default=".cache/jobs.sqlite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="create or resume a job")
+    run.add_argument("--job", required=True, help="job id; re-use it to resume")
+    run.add_argument("--csv", help="contacts CSV (name,email,company); required for a new job, "
+                                   "new rows are added to an existing one")
+    run.add_argument("--role", help="role applied for; required for a new job")
+    run.add_argument("--selection", choices=SELECTION_MODES, default=os.getenv("RESUME_SELECTION", "llm"))
+    run.add_argument("--max-resume-tokens", type=int)
+    run.add_argument("--renderer", choices=RENDERERS, help="resume PDF renderer; defaults to $RESUME_RENDERER or latex")
+    run.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of " + ",".join(STAGES))
+    run.add_argument("--workers", type=int, default=4)
+    run.add_argument("--rpm", type=int, default=0, help="max LLM requests per minute (0 = unlimited)")
+    run.add_argument("--max-attempts", type=int, default=3, help="give up on a row after this many failures")
+    run.add_argument("--transport", help="gmail or smtp; defaults to $MAIL_TRANSPORT")
+    run.add_argument("--resend-unconfirmed", action="store_true")
+    run.add_argument("--metrics-port", type=int, help="serve /metrics and /metrics.json on this port while running")
+    run.add_argument("--metrics-json", help="write the run's stage timings and counters to this file")
+
+    status = commands.add_parser("status", help="show a job's progress and errors")
+    status.add_argument("--job", required=True)
+    args = parser.parse_args(argv)
+
+    journal = JobJournal(args.journal)
+    if args.command == "status":
+        if journal.job_options(args.job) is None:
+            parser.error(f"unknown job {args.job!r}")
+        print_status(journal, args.job)
+        return
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    if args.max_attempts < 1:
+        parser.error("--max-attempts must be at least 1")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    options = journal.job_options(args.job)
+    if options is None:
+        if not args.csv or not args.role:
+            parser.error("a new job needs --csv and --role")
+        options = {"role": args.role, "selection_mode": args.selection, "max_resume_tokens": args.max_resume_tokens,
+                   "renderer": args.renderer}
+        journal.create_job(args.job, options)
+    if args.csv:
+        stats = {}
+        added = journal.add_contacts(args.job, (row for chunk in iter_contacts(args.csv, stats=stats) for row in chunk))
+        print(f"added {added} contacts ({stats['invalid']} invalid, {stats['duplicates']} duplicate rows skipped)")
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    try:
+        run_job(journal, args.job, options, stages, max_workers=args.workers, max_requests_per_minute=args.rpm,
+                max_attempts=args.max_attempts, transport_name=args.transport,
+                resend_unconfirmed=args.resend_unconfirmed)
+    finally:
+        if args.metrics_json:
+            with open(args.metrics_json, "w") as f:
+                json.dump(metrics.snapshot(), f, indent=2)
+    print_status(journal, args.job)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
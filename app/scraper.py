@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+
+from metrics import metrics
+from utils import RateLimiter
+
+# a URL ends at whitespace, a comma or a quote, so CSV cells next to it (quoted or not) are left out
+URL_RE = re.compile(r"https?://[^\s,\"'<>]+")
+
+
+def parse_urls(text):
+    """All http(s) URLs in `text` (one per line, or CSV cells), de-duplicated in order."""
+    return list(dict.fromkeys(url.rstrip(";") for url in URL_RE.findall(text or "")))
+
+
+class PageFetcher:
+    """
+    Fetches pages concurrently with an on-disk HTTP cache.
+
+    At most `max_workers` requests run at once, at most `per_host` of them against any one host, and
+    requests to a host are spaced to `per_host_per_minute`. Cached pages are revalidated with
+    If-None-Match / If-Modified-Since, so an unchanged page costs a 304 instead of a download; a
+    cached page younger than `max_age` seconds is served without any request at all.
+    """
+    def __init__(self, cache_dir=".cache/http", max_workers=8, per_host=2, per_host_per_minute=60,
+                 timeout=20, max_age=0, session=None):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.per_host_per_minute = per_host_per_minute
+        self.timeout = timeout
+        self.max_age = max_age
+        self.session = session or requests.Session()
+        self.session.headers.setdefault("User-Agent", "cold-email-generator/0.1")
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._host_pacing = {}
+
+    def _host(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.Semaphore(self.per_host)
+                self._host_pacing[host] = RateLimiter(self.per_host_per_minute)
+            return self._host_slots[host], self._host_pacing[host]
+
+    def _cache_paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".json"), os.path.join(self.cache_dir, key + ".html")
+
+    def _read_cache(self, url):
+        meta_path, body_path = self._cache_paths(url)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            with open(body_path, "r", encoding="utf-8") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _write_cache(self, url, response):
+        meta_path, body_path = self._cache_paths(url)
+        with open(body_path, "w", encoding="utf-8") as f:
+            f.write(response.text)
+        meta = {"url": url, "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"), "fetched": time.time()}
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+
+    def fetch(self, url) -> dict:
+        """
+        Fetch one page. Returns {url, ok, status, html, from_cache, error}; errors are reported in the
+        record instead of raised.
+        """
+        started = time.perf_counter()
+        page = self._fetch(url)
+        metrics.observe("fetch", time.perf_counter() - started, error=not page["ok"])
+        if page["ok"]:
+            metrics.incr("http_fetch", result="revalidated" if page["status"] == 304 else
+                         "cached" if page["from_cache"] else "downloaded")
+        return page
+
+    def _fetch(self, url):
+        meta, cached = self._read_cache(url)
+        if meta and self.max_age and time.time() - meta["fetched"] < self.max_age:
+            return {"url": url, "ok": True, "status": 200, "html": cached, "from_cache": True, "error": None}
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        slots, pacing = self._host(url)
+        try:
+            with slots:
+                pacing.acquire()
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            return {"url": url, "ok": False, "status": None, "html": None, "from_cache": False, "error": str(e)}
+        if response.status_code == 304 and cached is not None:
+            return {"url": url, "ok": True, "status": 304, "html": cached, "from_cache": True, "error": None}
+        if not response.ok:
+            return {"url": url, "ok": False, "status": response.status_code, "html": None, "from_cache": False,
+                    "error": f"HTTP {response.status_code}"}
+        self._write_cache(url, response)
+        return {"url": url, "ok": True, "status": response.status_code, "html": response.text,
+                "from_cache": False, "error": None}
+
+    def fetch_all(self, urls):
+        """Fetch every URL concurrently and yield the result records as they complete."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {pool.submit(self.fetch, url) for url in urls}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+
+def page_text(html):
+    """Visible text of an HTML page, extracted the same way WebBaseLoader does."""
+    with metrics.stage("html_to_text"):
+        return BeautifulSoup(html, "html.parser").get_text()
+
+
+def scrape_pipeline(urls, process, fetcher=None, max_workers=4):
+    """
+    Fetch `urls` and run `process(page_text)` on each page as soon as it arrives, so downloads and
+    processing (e.g. clean_text + Chain.extract_jobs) overlap. Yields (page, result, error) in
+    completion order; `error` is the fetch error or the exception raised by `process`.
+    """
+    fetcher = fetcher or PageFetcher()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for page in fetcher.fetch_all(urls):
+            if not page["ok"]:
+                yield page, None, page["error"]
+                continue
+            futures[pool.submit(_process_page, process, page["html"])] = page
+            done = [f for f in futures if f.done()]
+            for future in done:
+                yield _pipeline_result(futures.pop(future), future)
+        for future in as_completed(list(futures)):
+            yield _pipeline_result(futures.pop(future), future)
+
+
+def _process_page(process, html):
+    return process(page_text(html))
+
+
+def _pipeline_result(page, future):
+    try:
+        return page, future.result(), None
+    except Exception as e:
+        return page, None, e
@@ -1,19 +1,231 @@
+import queue
 import re
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+_TAG_RE = re.compile(r'<[^>]*?>')
+_URL_RE = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+# runs of anything that is not a letter, digit or space
+_SYMBOLS_RE = re.compile(r'[^a-zA-Z0-9 ]+')
+
+def _clean_tag_free(text):
+    # Remove URLs, then special characters, then collapse whitespace and trim
+    return ' '.join(_SYMBOLS_RE.sub('', _URL_RE.sub('', text)).split())
 
 def clean_text(text):
-    # Remove HTML tags
-    text = re.sub(r'<[^>]*?>', '', text)
-    # Remove URLs
-    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-    # Remove special characters
-    text = re.sub(r'[^a-zA-Z0-9 ]', '', text)
-    # Replace multiple spaces with a single space
-    text = re.sub(r'\s{2,}', ' ', text)
-    # Trim leading and trailing whitespace
-    text = text.strip()
-    # Remove extra whitespace
-    text = ' '.join(text.split())
-    return text
+    # Remove HTML tags first: removing a tag can join the text around it into a URL
+    with metrics.stage("clean_text"):
+        return _clean_tag_free(_TAG_RE.sub('', text))
+
+def iter_clean_text(chunks):
+    """
+    Streaming clean_text: consume the page as an iterable of string chunks and yield cleaned pieces;
+    ' '.join(pieces) equals clean_text(''.join(chunks)).
+
+    A chunk is only cleaned up to its last safe boundary: text after an unclosed '<' is held back until
+    the tag closes, and tag-free text is cut at its last space (URLs never contain spaces, and symbols
+    are deleted without inserting one, so a newline is not a safe cut). The rest carries over.
+    """
+    raw = ''
+    tag_free = ''
+    for chunk in chunks:
+        raw += chunk
+        open_at = raw.find('<', raw.rfind('>') + 1)
+        if open_at == -1:
+            ready, raw = raw, ''
+        else:
+            ready, raw = raw[:open_at], raw[open_at:]
+        tag_free += _TAG_RE.sub('', ready)
+        cut = tag_free.rfind(' ')
+        if cut != -1:
+            piece = _clean_tag_free(tag_free[:cut])
+            tag_free = tag_free[cut:]
+            if piece:
+                yield piece
+    piece = _clean_tag_free(tag_free + _TAG_RE.sub('', raw))
+    if piece:
+        yield piece
+
+def stream_concurrently(streams, max_workers=4):
+    """
+    Drain several generators at once, at most `max_workers` at a time. `streams` are zero-argument
+    callables returning an iterable. Yields (index, kind, value) events as they happen, where kind is
+    "chunk" (value is the next item), "done" (value is None) or "error" (value is the exception).
+    Events of one stream keep their order; events of different streams interleave.
+    """
+    events = queue.Queue()
+
+    def drain(index, stream):
+        try:
+            for item in stream():
+                events.put((index, "chunk", item))
+            events.put((index, "done", None))
+        except Exception as e:
+            events.put((index, "error", e))
+
+    streams = list(streams)
+    if not streams:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for index, stream in enumerate(streams):
+            pool.submit(drain, index, stream)
+        finished = 0
+        while finished < len(streams):
+            event = events.get()
+            if event[1] != "chunk":
+                finished += 1
+            yield event
+
+def split_text(text, max_tokens, overlap_tokens=0, chars_per_token=4):
+    """
+    Split `text` on word boundaries into chunks of roughly `max_tokens` tokens (estimated at
+    `chars_per_token` characters per token), each starting `overlap_tokens` before the previous
+    chunk ended so a posting cut at a boundary appears whole in at least one chunk.
+    """
+    max_chars = max_tokens * chars_per_token
+    if len(text) <= max_chars:
+        return [text]
+    overlap_chars = min(overlap_tokens * chars_per_token, max_chars // 2)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + max_chars
+        if end < len(text):
+            space = text.rfind(" ", start + overlap_chars + 1, end)
+            if space != -1:
+                end = space
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = max(end - overlap_chars, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return [chunk for chunk in chunks if chunk]
 
 def format_latex_string(string: str) -> str:
-    return string.replace("\\", "\\\\").replace("_", "\\_").replace("&", "\\&").replace("%", "\\%")
\ No newline at end of file
+    return string.replace("\\", "\\\\").replace("_", "\\_").replace("&", "\\&").replace("%", "\\%")
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """True when `exc` looks like an HTTP 429 / rate-limit response from the provider."""
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status == 429:
+        return True
+    message = str(exc).lower()
+    return "rate limit" in message or "rate_limit" in message or "429" in message
+
+def retry_after_seconds(exc: Exception):
+    """Read a Retry-After header off the exception's response, if the provider sent one."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Shared pacing for calls against a rate-limited API.
+
+    Spaces calls so at most `max_per_minute` start per minute (0 disables pacing), and lets any
+    caller that hit a 429 pause every other caller via `cool_down`, so a pool of workers backs off
+    together instead of each one tripping the limit in turn.
+    """
+    def __init__(self, max_per_minute: int = 0):
+        self.interval = 60.0 / max_per_minute if max_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._paused_until)
+            self._next_slot = start + self.interval
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def cool_down(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class TokenBucket:
+    """
+    Token bucket allowing bursts of up to `capacity` calls and a sustained `rate` calls per second.
+    `acquire` blocks until enough tokens are available.
+    """
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def jittered_delay(attempt: int, base_delay=1.0, max_delay=30.0) -> float:
+    """Exponential backoff for the given 0-based attempt, with up to 50% random jitter."""
+    return min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def call_with_backoff(fn, *args, retries=5, base_delay=1.0, max_delay=30.0, limiter=None, **kwargs):
+    """
+    Call `fn(*args, **kwargs)`, retrying rate-limit errors with jittered exponential backoff.
+    Any other exception (or the last rate-limit error) is re-raised unchanged.
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not is_rate_limit_error(e):
+                raise
+            _back_off(e, attempt, base_delay, max_delay, limiter)
+
+
+def stream_with_backoff(fn, *args, retries=5, base_delay=1.0, max_delay=30.0, limiter=None, **kwargs):
+    """
+    call_with_backoff for a stream: yields the pieces of `fn(*args, **kwargs)`, starting the stream over
+    on a rate-limit error raised before its first piece. Errors after that are re-raised unchanged, as
+    the pieces already yielded cannot be taken back.
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        started = False
+        try:
+            for piece in fn(*args, **kwargs):
+                started = True
+                yield piece
+            return
+        except Exception as e:
+            if started or attempt == retries or not is_rate_limit_error(e):
+                raise
+            _back_off(e, attempt, base_delay, max_delay, limiter)
+
+
+def _back_off(exc, attempt, base_delay, max_delay, limiter):
+    metrics.incr("rate_limit_retries")
+    delay = retry_after_seconds(exc) or jittered_delay(attempt, base_delay, max_delay)
+    if limiter is not None:
+        limiter.cool_down(delay)
+    else:
+        time.sleep(delay)
@@ -0,0 +1,120 @@
+"""
+clean_text micro-benchmark over synthetic multi-MB careers pages, with an equivalence check.
+
+    python benchmarks/bench_clean_text.py --megabytes 4
+
+Before timing, the current clean_text and the streaming iter_clean_text (at several chunk sizes) are
+checked against the original five-pass implementation on a golden corpus of edge cases plus the
+generated pages; any mismatch aborts the run. Run from the repository root.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from utils import clean_text, iter_clean_text  # noqa: E402
+
+
+def reference_clean_text(text):
+    """The original implementation, kept verbatim as the source of truth."""
+    text = re.sub(r'<[^>]*?>', '', text)
+    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+    text = re.sub(r'[^a-zA-Z0-9 ]', '', text)
+    text = re.sub(r'\s{2,}', ' ', text)
+    text = text.strip()
+    text = ' '.join(text.split())
+    return text
+
+
+GOLDEN = [
+    "",
+    "   ",
+    "plain words only",
+    "line\nbreaks\tand\r\ntabs join words",
+    "<p>Senior <b>Engineer</b></p>",
+    "ht<b>tp://example.com/joined-by-tag rest",
+    "see https://jobs.example.com/apply?id=42&ref=x now",
+    "http://",
+    "http:// x",
+    "a < b and c > d",
+    "unclosed <tag never ends",
+    "<<nested>> <a href='x'>link</a>",
+    "Café naïve —  non-breaking space",
+    "C++ / C# & .NET (5+ yrs) 100%",
+    "%20%41 https://a.b/%2F%zz tail",
+    "mixed em spaces",
+]
+
+WORDS = ["Software", "Engineer", "Python", "Kubernetes", "remote", "Bangalore", "5+", "years", "C++",
+         "café", "—", "&amp;", "100%", "(hybrid)", "team-player", "R&D"]
+
+
+def careers_page(size, seed=0):
+    """Synthetic careers page of roughly `size` characters: nested markup, links, scripts, unicode."""
+    rng = random.Random(seed)
+    parts = ["<html><head><script>var x = '<div>' + 1;</script><style>a{color:red}</style></head><body>"]
+    total = 0
+    while total < size:
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))
+        card = (
+            f"<div class=\"job-card\" data-id=\"{rng.randint(1, 10**6)}\">\n"
+            f"  <h2><a href=\"https://careers.example.com/jobs/{rng.randint(1, 10**6)}?src=list&amp;p=2\">"
+            f"{rng.choice(WORDS)} {rng.choice(WORDS)}</a></h2>\n"
+            f"  <p>{words}</p>\n  <ul><li>{rng.choice(WORDS)}</li>\n<li>http://apply.example.com/x%20y</li></ul>\n"
+            f"</div>\n"
+        )
+        parts.append(card)
+        total += len(card)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def chunked(text, size):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+def check(samples):
+    for sample in samples:
+        expected = reference_clean_text(sample)
+        if clean_text(sample) != expected:
+            raise SystemExit(f"clean_text mismatch on {sample[:60]!r}")
+        for size in (1, 7, 64, 4096):
+            streamed = " ".join(iter_clean_text(chunked(sample, size)))
+            if streamed != expected:
+                raise SystemExit(f"iter_clean_text(chunk={size}) mismatch on {sample[:60]!r}")
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    page = careers_page(int(args.megabytes * 1024 * 1024))
+    check(GOLDEN + [careers_page(20000, seed) for seed in range(5)])
+    check([page[:200000]])
+    print(f"golden corpus OK; page size {len(page) / 1024 / 1024:.1f} MB")
+
+    reference = best_of(lambda: reference_clean_text(page), args.repeat)
+    current = best_of(lambda: clean_text(page), args.repeat)
+    streaming = best_of(lambda: " ".join(iter_clean_text(chunked(page, 64 * 1024))), args.repeat)
+    for label, seconds in (("original", reference), ("clean_text", current), ("streaming 64KB", streaming)):
+        print(f"{label:>15}: {seconds * 1000:8.1f}ms  {len(page) / seconds / 1024 / 1024:7.1f} MB/s  "
+              f"{reference / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Cold vs. precompiled-format resume compile time over a batch.
+
+    python benchmarks/bench_latex_format.py --count 20
+
+Run from the repository root; needs pdflatex and the mylatexformat package.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from ResumeEditor import Resume, RESUME_PREAMBLE  # noqa: E402
+from latex_compiler import compile_latex, precompiled_format  # noqa: E402
+
+
+def load_resume(path):
+    with open(path, "r") as f:
+        data = json.load(f)
+    return Resume(
+        education=data.get("education", []),
+        experience=data.get("experience", []),
+        projects=data.get("projects", []),
+        skills=data.get("skills", {}),
+        name=data.get("name", ""),
+        phone=data.get("contact", {}).get("phone", ""),
+        email=data.get("contact", {}).get("email", ""),
+        linkedin=data.get("contact", {}).get("linkedin", ""),
+        github=data.get("contact", {}).get("github", "")
+    )
+
+
+def run_batch(tex, count, output_dir, fmt=None):
+    timings = []
+    for i in range(count):
+        result = compile_latex(tex, f"bench_{i}.pdf", output_dir=output_dir, fmt=fmt)
+        if not result["ok"]:
+            raise SystemExit(f"compile failed: {result['error']}")
+        timings.append(result["seconds"])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20, help="resumes per batch")
+    parser.add_argument("--resume", default="data/resume.json")
+    args = parser.parse_args()
+
+    tex = load_resume(args.resume).generate_full_resume_latex()
+    with tempfile.TemporaryDirectory() as output_dir:
+        started = time.perf_counter()
+        fmt = precompiled_format(RESUME_PREAMBLE, cache_dir=os.path.join(output_dir, "fmt"))
+        build_seconds = time.perf_counter() - started
+        if fmt is None:
+            raise SystemExit("could not build the precompiled format (is mylatexformat installed?)")
+
+        cold = run_batch(tex, args.count, output_dir)
+        warm = run_batch(tex, args.count, output_dir, fmt=fmt)
+
+    print(f"format build: {build_seconds:.2f}s (once per template change)")
+    for label, timings in (("cold", cold), ("precompiled", warm)):
+        print(f"{label:>12}: total {sum(timings):.2f}s  mean {statistics.mean(timings) * 1000:.0f}ms  "
+              f"median {statistics.median(timings) * 1000:.0f}ms")
+    print(f"{'speedup':>12}: {sum(cold) / sum(warm):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+End-to-end load test of the mail-merge and URL pipelines against the fake LLM, fully offline.
+
+    python benchmarks/bench_pipeline.py --contacts 500 --companies 50 --pages 20 --latency 0.3 --rate-limit-rate 0.05
+
+Mail-merge: N synthetic contacts go through generator.generate_drafts; a draft's latency is the time
+from the row being pulled to the draft being yielded. URL flow: synthetic careers pages are served
+from a local HTTP server and run through scraper.scrape_pipeline, Chain.extract_jobs and
+Chain.stream_mail as in app/main.py; latency is per email, from its page being extracted.
+Reports throughput, p50/p95 latency and model calls/tokens (from Chain.usage).
+
+Portfolio links come from a fixed list unless --real-portfolio is given (that needs the Chroma
+embedding model, as do --selection local and hybrid). Resumes are rendered to LaTeX source but not
+compiled unless --render latex (pdflatex) or --render reportlab is given.
+Run from the repository root.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from chains import Chain  # noqa: E402
+from fake_llm import FakeChatModel, ROLES, SKILLS  # noqa: E402
+from generator import generate_drafts  # noqa: E402
+from metrics import metrics  # noqa: E402
+from render_store import RenderStore  # noqa: E402
+from resume_selector import SELECTION_MODES  # noqa: E402
+from scraper import PageFetcher, scrape_pipeline  # noqa: E402
+from utils import RateLimiter, clean_text, stream_concurrently  # noqa: E402
+
+
+class StaticPortfolio:
+    """Portfolio stand-in returning the same links for every query."""
+    links = ["https://example.com/portfolio/ml-platform", "https://example.com/portfolio/data-pipelines"]
+
+    def load_portfolio(self):
+        pass
+
+    def query_links(self, skills, n_results=2):
+        return list(self.links)
+
+    def query_links_many(self, skill_lists, n_results=2):
+        return [list(self.links) for _ in skill_lists]
+
+
+class LatexOnlyStore:
+    """RenderStore stand-in that builds the LaTeX source but does not compile it."""
+    def get_or_render(self, resume, name_prefix="resume", compiler=None):
+        resume.generate_full_resume_latex()
+        return f"{name_prefix}_{resume.content_hash()[:16]}.pdf"
+
+    def release(self, file_name):
+        pass
+
+    def evict(self):
+        return 0
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(label, latencies, elapsed, count, unit, usage, failures):
+    return {
+        "pipeline": label,
+        unit: count,
+        "failed": failures,
+        "seconds": round(elapsed, 3),
+        f"{unit}_per_second": round(count / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        **usage,
+    }
+
+
+def bench_mailmerge(chain, portfolio, args, store):
+    rng = random.Random(args.seed)
+    companies = [f"Company {i}" for i in range(args.companies)]
+    rows = [{"name": f"Contact {i}", "email": f"contact{i}@example.com", "company": rng.choice(companies)}
+            for i in range(args.contacts)]
+    pulled = {}
+
+    def timed_rows():
+        for row in rows:
+            pulled[row["email"]] = time.perf_counter()
+            yield row
+
+    latencies, failures = [], 0
+    started = time.perf_counter()
+    for draft in generate_drafts(chain, portfolio, timed_rows(), "Software Engineer",
+                                 max_workers=args.workers, store=store, selection_mode=args.selection):
+        latencies.append(time.perf_counter() - pulled[draft["email"]])
+        failures += draft["resume_file"] is None
+    return latencies, time.perf_counter() - started, failures
+
+
+def careers_page(index, jobs):
+    postings = "".join(
+        f"<div class='job'><h2>{random.Random(index * 100 + j).choice(ROLES)}</h2>"
+        f"<p>Requirements: {', '.join(SKILLS[j % len(SKILLS):][:3])}. Apply at https://example.com/jobs/{index}/{j}</p></div>"
+        for j in range(jobs)
+    )
+    return f"<html><body><h1>Careers at Company {index}</h1>{postings}</body></html>"
+
+
+def serve_pages(pages, jobs):
+    bodies = {f"/careers/{i}": careers_page(i, jobs).encode("utf-8") for i in range(pages)}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            body = bodies.get(self.path)
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, [f"http://127.0.0.1:{server.server_port}{path}" for path in bodies]
+
+
+def bench_urls(chain, portfolio, args):
+    server, urls = serve_pages(args.pages, args.jobs_per_page)
+    latencies, failures, emails = [], 0, 0
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-http-") as cache_dir:
+            fetcher = PageFetcher(cache_dir=cache_dir, per_host=args.workers, per_host_per_minute=0)
+            limiter = RateLimiter()
+            started = time.perf_counter()
+            for page, jobs, error in scrape_pipeline(urls, lambda text: chain.extract_jobs(clean_text(text)),
+                                                     fetcher=fetcher, max_workers=args.workers):
+                if error:
+                    failures += 1
+                    continue
+                links_per_job = portfolio.query_links_many([job.get("skills", []) for job in jobs])
+                streams = [lambda job=job, links=links: chain.stream_mail(job, links, limiter)
+                           for job, links in zip(jobs, links_per_job)]
+                page_started = time.perf_counter()
+                for _, kind, _ in stream_concurrently(streams, max_workers=args.workers):
+                    if kind == "done":
+                        emails += 1
+                        latencies.append(time.perf_counter() - page_started)
+                    elif kind == "error":
+                        failures += 1
+            elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+    return latencies, elapsed, emails, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pipeline", choices=["mailmerge", "urls", "both"], default="both")
+    parser.add_argument("--contacts", type=int, default=200)
+    parser.add_argument("--companies", type=int, default=20, help="distinct companies among the contacts")
+    parser.add_argument("--pages", type=int, default=10, help="careers pages for the URL flow")
+    parser.add_argument("--jobs-per-page", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency per call, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of JSON answers the fake model breaks")
+    parser.add_argument("--no-json-mode", action="store_true", help="extract with plain prompts instead of JSON mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render", choices=["none", "latex", "reportlab"], default="none")
+    parser.add_argument("--real-portfolio", action="store_true")
+    parser.add_argument("--selection", choices=SELECTION_MODES, default="llm",
+                        help="resume projects/experience selection; local and hybrid need --real-portfolio")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    parser.add_argument("--breakdown", action="store_true", help="also print per-stage timings (metrics.Metrics)")
+    args = parser.parse_args()
+    if args.selection != "llm" and not args.real_portfolio:
+        parser.error("--selection local/hybrid needs --real-portfolio")
+
+    if args.real_portfolio:
+        from portfolio import Portfolio
+        portfolio = Portfolio()
+        portfolio.load_portfolio()
+    else:
+        portfolio = StaticPortfolio()
+
+    def new_chain():
+        chain = Chain(cache=None, backend="fake", json_mode=not args.no_json_mode)
+        chain.llm = FakeChatModel(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                  error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                                  malformed_rate=args.malformed_rate,
+                                  retry_after=min(args.latency, 0.5), jobs_per_page=args.jobs_per_page,
+                                  seed=args.seed)
+        return chain
+
+    results = []
+    if args.pipeline in ("mailmerge", "both"):
+        chain = new_chain()
+        with tempfile.TemporaryDirectory(prefix="bench-pdfs-") as output_dir:
+            store = LatexOnlyStore() if args.render == "none" else \
+                RenderStore(output_dir, os.path.join(output_dir, "index.sqlite"), renderer=args.render)
+            latencies, elapsed, failures = bench_mailmerge(chain, portfolio, args, store)
+        results.append(summarize("mailmerge", latencies, elapsed, args.contacts, "drafts", chain.usage, failures))
+    if args.pipeline in ("urls", "both"):
+        chain = new_chain()
+        latencies, elapsed, emails, failures = bench_urls(chain, portfolio, args)
+        results.append(summarize("urls", latencies, elapsed, emails, "emails", chain.usage, failures))
+
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+            continue
+        unit = "drafts" if result["pipeline"] == "mailmerge" else "emails"
+        print(f"{result['pipeline']:>9}: {result[unit]} {unit} in {result['seconds']:.2f}s "
+              f"({result[unit + '_per_second']:.1f}/s, {result['failed']} failed)  "
+              f"p50 {result['p50_ms']:.0f}ms  p95 {result['p95_ms']:.0f}ms  "
+              f"calls {result['calls']}  tokens in/out {result['input_tokens']}/{result['output_tokens']}")
+    if args.breakdown:
+        snapshot = metrics.snapshot()
+        if args.json:
+            print(json.dumps(snapshot))
+        else:
+            for name, stage in snapshot["stages"].items():
+                print(f"  {name:<32} n={stage['count']:<6} err={stage['errors']:<4} "
+                      f"p50 {stage['p50_ms']:8.1f}ms  p95 {stage['p95_ms']:8.1f}ms  total {stage['total_s']:.2f}s")
+            for counter in snapshot["counters"]:
+                if counter["name"] in ("llm_json_rejected", "llm_json_repairs", "llm_json_fixes",
+                                       "llm_parse_errors"):
+                    print(f"  {counter['name']}[{counter['labels']['call']}] {counter['value']}")
+
+
+if __name__ == "__main__":
+    main()
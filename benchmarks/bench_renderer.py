@@ -0,0 +1,74 @@
+"""
+Resume PDF rendering time: in-process reportlab vs. pdflatex (cold and with the precompiled format).
+
+    python benchmarks/bench_renderer.py --count 20
+
+The pdflatex rows are skipped when pdflatex is not installed. With PyPDF2 available, the text of
+one reportlab PDF is extracted and checked for every section heading, as a stand-in for an ATS parser.
+Run from the repository root.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from ResumeEditor import RESUME_PREAMBLE  # noqa: E402
+from latex_compiler import precompiled_format  # noqa: E402
+from bench_latex_format import load_resume  # noqa: E402
+
+
+def time_renders(resume, count, output_dir, **kwargs):
+    timings = []
+    for i in range(count):
+        started = time.perf_counter()
+        resume.generate_full_resume_pdf(f"bench_{i}.pdf", output_dir=output_dir, **kwargs)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def check_text(path):
+    try:
+        from PyPDF2 import PdfReader
+    except ImportError:
+        return "skipped (PyPDF2 not installed)"
+    text = " ".join(page.extract_text() for page in PdfReader(path).pages).upper()
+    missing = [heading for heading in ("EDUCATION", "EXPERIENCE", "PROJECTS", "SKILLS") if heading not in text]
+    return f"missing {', '.join(missing)}" if missing else "all section headings found"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20, help="resumes per renderer")
+    parser.add_argument("--resume", default="data/resume.json")
+    args = parser.parse_args()
+
+    resume = load_resume(args.resume)
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        results["reportlab"] = time_renders(resume, args.count, output_dir, renderer="reportlab")
+        sample = os.path.join(output_dir, "bench_0.pdf")
+        size = os.path.getsize(sample)
+        text_check = check_text(sample)
+        if shutil.which("pdflatex"):
+            results["pdflatex cold"] = time_renders(resume, args.count, output_dir, use_format=False)
+            if precompiled_format(RESUME_PREAMBLE) is not None:
+                results["pdflatex format"] = time_renders(resume, args.count, output_dir)
+
+    for label, timings in results.items():
+        print(f"{label:>16}: mean {statistics.mean(timings) * 1000:7.1f}ms  median {statistics.median(timings) * 1000:7.1f}ms  "
+              f"max {max(timings) * 1000:7.1f}ms  ({len(timings)} resumes)")
+    if len(results) == 1:
+        print(f"{'pdflatex':>16}: skipped (pdflatex not found)")
+    else:
+        fastest_latex = min(statistics.median(t) for label, t in results.items() if label.startswith("pdflatex"))
+        print(f"{'speedup':>16}: {fastest_latex / statistics.median(results['reportlab']):.1f}x (median, vs. fastest pdflatex)")
+    print(f"reportlab PDF: {size / 1024:.1f} KiB; text extraction: {text_check}")
+
+
+if __name__ == "__main__":
+    main()
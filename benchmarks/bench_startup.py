@@ -0,0 +1,68 @@
+"""
+Startup cost of the Streamlit app: module import time and time to first paint.
+
+    python benchmarks/bench_startup.py --runs 5
+
+Each measurement runs in a fresh interpreter so nothing is already imported. "eager" imports the
+modules app/main.py used to pull in at startup; "lazy" imports app/main.py as it is now.
+"first paint" runs one full script pass with Streamlit's AppTest (no button pressed).
+Run from the repository root.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+EAGER_IMPORTS = """
+import streamlit
+from langchain_community.document_loaders import WebBaseLoader
+import chains, portfolio, mailmerge, ResumeEditor, utils
+"""
+
+LAZY_IMPORTS = """
+import main
+"""
+
+FIRST_PAINT = """
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app/main.py", default_timeout=120)
+at.run()
+assert not at.exception, at.exception
+"""
+
+TIMED = """
+import sys, time
+sys.path.insert(0, "app")
+started = time.perf_counter()
+{body}
+print(time.perf_counter() - started)
+"""
+
+
+def measure(body, runs):
+    timings = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", TIMED.format(body=body)], capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise SystemExit(proc.stderr)
+        timings.append(float(proc.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--skip-first-paint", action="store_true")
+    args = parser.parse_args()
+
+    scenarios = [("eager imports", EAGER_IMPORTS), ("lazy imports", LAZY_IMPORTS)]
+    if not args.skip_first_paint:
+        scenarios.append(("first paint", FIRST_PAINT))
+    for label, body in scenarios:
+        timings = measure(body, args.runs)
+        print(f"{label:>14}: median {statistics.median(timings) * 1000:7.0f}ms  "
+              f"min {min(timings) * 1000:7.0f}ms  ({args.runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
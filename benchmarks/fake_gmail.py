@@ -0,0 +1,88 @@
+"""
+Local stand-in for the Gmail send API, for exercising mailmerge.send_emails without a Google account.
+
+    python benchmarks/fake_gmail.py --port 8025 --error-rate 0.1
+    GMAIL_API_ENDPOINT=http://127.0.0.1:8025/ streamlit run app/main.py
+
+Accepts single messages.send calls and Gmail batch requests. Each message is answered 200 with a
+fake id, or (at --error-rate) 429/503 so the retry path gets exercised. Nothing is delivered.
+"""
+import argparse
+import json
+import random
+import threading
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    error_rate = 0.0
+    sent = []
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _outcome(self):
+        """(status, body) for one messages.send call."""
+        if random.random() < self.error_rate:
+            status = random.choice([429, 503])
+            return status, {"error": {"code": status, "message": "fake transient error"}}
+        message_id = uuid.uuid4().hex[:16]
+        with self.lock:
+            self.sent.append(message_id)
+        return 200, {"id": message_id, "labelIds": ["SENT"]}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/batch/"):
+            self._handle_batch(body)
+        elif self.path.split("?")[0].endswith("/messages/send"):
+            status, payload = self._outcome()
+            self._reply(status, "application/json", json.dumps(payload).encode())
+        else:
+            self._reply(404, "application/json", b'{"error": {"code": 404}}')
+
+    def _handle_batch(self, body):
+        envelope = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+        )
+        boundary = "batch_" + uuid.uuid4().hex
+        parts = []
+        for part in envelope.iter_parts():
+            content_id = part["Content-ID"].strip("<>")
+            status, payload = self._outcome()
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        response = "".join(parts) + f"--{boundary}--\r\n"
+        self._reply(200, f"multipart/mixed; boundary={boundary}", response.encode())
+
+    def _reply(self, status, content_type, payload):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(port=8025, error_rate=0.0):
+    """Start the fake server on a background thread and return it (call .shutdown() to stop)."""
+    FakeGmailHandler.error_rate = error_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeGmailHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gmail send API")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of sends answered 429/503")
+    args = parser.parse_args()
+    FakeGmailHandler.error_rate = args.error_rate
+    print(f"Fake Gmail API on http://127.0.0.1:{args.port}/")
+    ThreadingHTTPServer(("127.0.0.1", args.port), FakeGmailHandler).serve_forever()
@@ -0,0 +1,152 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from langchain_core.exceptions import OutputParserException  # noqa: E402
+from langchain_core.language_models.chat_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+from langchain_core.prompts import PromptTemplate  # noqa: E402
+
+from chains import Chain  # noqa: E402
+from fake_llm import FakeJSONValidateError  # noqa: E402
+from json_output import JobPostings, ResumeSelection, extract_json, failed_generation, parse_json  # noqa: E402
+from llm_cache import LLMCache  # noqa: E402
+from metrics import metrics  # noqa: E402
+
+JOBS = {"jobs": [{"role": "Data Engineer", "experience": "3+ years", "skills": ["SQL"], "description": "d"}]}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Answers each call with the next scripted reply; an exception in the script is raised instead."""
+    replies: list
+    prompts: list = []
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append("\n".join(str(m.content) for m in messages))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+
+def counter(name):
+    return sum(c["value"] for c in metrics.snapshot()["counters"] if c["name"] == name)
+
+
+class ExtractJsonTest(unittest.TestCase):
+    def test_valid_json_is_not_repaired(self):
+        self.assertEqual(extract_json('{"a": [1, 2]}'), ({"a": [1, 2]}, False))
+
+    def test_code_fences_are_stripped(self):
+        self.assertEqual(extract_json('```json\n{"a": 1}\n```'), ({"a": 1}, True))
+
+    def test_prose_around_the_value_is_ignored(self):
+        text = 'Sure! Here are the jobs [with notes]:\n{"a": {"b": 2}}\nLet me know if you need more.'
+        self.assertEqual(extract_json(text), ({"a": {"b": 2}}, True))
+
+    def test_trailing_commas_are_dropped(self):
+        self.assertEqual(extract_json('{"a": [1, 2,], "b": 3,}'), ({"a": [1, 2], "b": 3}, True))
+
+    def test_no_json_value_raises(self):
+        with self.assertRaises(OutputParserException) as raised:
+            extract_json("I could not find any jobs on this page.")
+        self.assertEqual(raised.exception.llm_output, "I could not find any jobs on this page.")
+
+
+class ParseJsonTest(unittest.TestCase):
+    def test_bare_list_and_single_posting_are_wrapped(self):
+        posting = JOBS["jobs"][0]
+        self.assertEqual(parse_json(json.dumps([posting]), JobPostings)[0]["jobs"][0]["role"], "Data Engineer")
+        self.assertEqual(parse_json(json.dumps(posting), JobPostings)[0]["jobs"][0]["role"], "Data Engineer")
+
+    def test_numbers_and_entry_objects_are_accepted(self):
+        value, repaired = parse_json('{"projects": [{"id": "p2"}, "p1"], "experience": [3]}', ResumeSelection)
+        self.assertEqual(value, {"projects": [{"id": "p2"}, "p1"], "experience": ["3"]})
+        self.assertFalse(repaired)
+
+    def test_schema_errors_name_the_field(self):
+        text = '{"jobs": "[{\\"role\\": \\"x\\"}]"}'
+        with self.assertRaises(OutputParserException) as raised:
+            parse_json(text, JobPostings)
+        self.assertIn("jobs", str(raised.exception))
+        self.assertEqual(raised.exception.llm_output, text)
+
+
+class FailedGenerationTest(unittest.TestCase):
+    def test_reads_the_rejected_completion(self):
+        self.assertEqual(failed_generation(FakeJSONValidateError("```json\n{}\n```")), "```json\n{}\n```")
+
+    def test_other_errors_are_not_rejections(self):
+        self.assertIsNone(failed_generation(ValueError("boom")))
+
+
+class InvokeJsonTest(unittest.TestCase):
+    prompt = PromptTemplate.from_template("Extract the jobs from: {page}")
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = LLMCache(os.path.join(tmp.name, "llm.sqlite"))
+
+    def chain(self, *replies):
+        chain = Chain(cache=self.cache, backend="fake")
+        chain.llm = ScriptedChatModel(replies=list(replies), prompts=[])
+        return chain
+
+    def invoke(self, chain):
+        return chain._invoke_json(self.prompt, {"page": "careers"}, JobPostings, name="extract_jobs")
+
+    def cached(self, chain):
+        return self.cache.get(chain._cache_key(self.prompt, {"page": "careers"}))
+
+    def test_repaired_answer_is_cached_as_validated_json(self):
+        chain = self.chain(f"```json\n{json.dumps(JOBS)}\n```")
+        self.assertEqual(self.invoke(chain)["jobs"][0]["role"], "Data Engineer")
+        self.assertEqual(json.loads(self.cached(chain))["jobs"][0]["role"], "Data Engineer")
+        self.assertEqual(self.invoke(chain)["jobs"][0]["role"], "Data Engineer")
+        self.assertEqual(len(chain.llm.prompts), 1)
+        self.assertEqual(counter("llm_json_repairs"), 1)
+
+    def test_fix_up_is_counted_once_and_cached_for_the_original_prompt(self):
+        chain = self.chain('{"jobs": "not a list"}', json.dumps(JOBS))
+        self.assertEqual(self.invoke(chain)["jobs"][0]["role"], "Data Engineer")
+        self.assertIn("### INVALID JSON:", chain.llm.prompts[1])
+        self.assertEqual((counter("llm_json_fixes"), counter("llm_parse_errors")), (1, 0))
+        self.assertEqual(json.loads(self.cached(chain)), JobPostings.model_validate(JOBS).model_dump())
+        self.invoke(chain)
+        self.assertEqual(len(chain.llm.prompts), 2)
+        self.assertEqual(counter("llm_json_fixes"), 1)
+
+    def test_failed_fix_up_is_a_parse_error(self):
+        chain = self.chain('{"jobs": "not a list"}', "still not JSON")
+        with self.assertRaises(OutputParserException):
+            self.invoke(chain)
+        self.assertEqual((counter("llm_json_fixes"), counter("llm_parse_errors")), (1, 1))
+        self.assertIsNone(self.cached(chain))
+
+    def test_answer_rejected_in_json_mode_is_repaired_locally(self):
+        chain = self.chain(FakeJSONValidateError(f"Here you go:\n{json.dumps(JOBS)}"))
+        self.assertEqual(self.invoke(chain)["jobs"][0]["role"], "Data Engineer")
+        self.assertEqual((counter("llm_json_rejected"), counter("llm_json_fixes")), (1, 0))
+        self.assertIsNotNone(self.cached(chain))
+
+    def test_answer_rejected_in_json_mode_goes_to_the_fix_up(self):
+        chain = self.chain(FakeJSONValidateError('{"jobs": [{"role": "Data Engineer"'), json.dumps(JOBS))
+        self.assertEqual(self.invoke(chain)["jobs"][0]["role"], "Data Engineer")
+        self.assertIn('{"jobs": [{"role": "Data Engineer"', chain.llm.prompts[1])
+        self.assertEqual((counter("llm_json_rejected"), counter("llm_json_fixes")), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import mailmerge  # noqa: E402
+import runner  # noqa: E402
+from journal import GENERATED, PENDING, RENDERED, SENDING, SENT, JobJournal  # noqa: E402
+
+
+class FakeTransport:
+    """Answers each send with the next outcome of its address: True, or an error message."""
+    def __init__(self, outcomes=None):
+        self.outcomes = outcomes or {}
+        self.sent = []
+
+    def send_all(self, messages, sender=None):
+        results = []
+        for message in messages:
+            self.sent.append(message["to"])
+            outcomes = self.outcomes.get(message["to"], [])
+            outcome = outcomes.pop(0) if outcomes else True
+            results.append({"to": message["to"], "ok": outcome is True, "id": f"id-{len(self.sent)}",
+                            "error": None if outcome is True else outcome})
+        return results
+
+    def close(self):
+        pass
+
+
+class RunnerTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        patcher = mock.patch.object(runner, "jittered_delay", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.journal = JobJournal(os.path.join(tmp.name, "jobs.sqlite"))
+        self.journal.create_job("job", {"role": "Engineer"})
+
+    def add(self, *emails, status=PENDING):
+        self.journal.add_contacts("job", [{"email": email, "name": "N", "company": "C"} for email in emails])
+        for email in emails:
+            if status != PENDING:
+                self.journal.advance("job", email, status, subject="s", body="b", resume_file="r.pdf")
+
+    def row(self, email):
+        for status in (PENDING, GENERATED, RENDERED, SENDING, SENT):
+            for row in self.journal.rows("job", status):
+                if row["email"] == email:
+                    return row
+        return None
+
+
+class JobJournalTest(RunnerTestCase):
+    def test_rows_move_through_the_stages(self):
+        self.add("a@example.com", "b@example.com")
+        self.journal.advance("job", "a@example.com", GENERATED, subject="s", body="b", selection={"projects": ["p1"]})
+        self.journal.advance("job", "a@example.com", RENDERED, resume_file="a.pdf")
+        row = self.row("a@example.com")
+        self.assertEqual(row["status"], RENDERED)
+        self.assertEqual(row["selection"], {"projects": ["p1"]})
+        self.assertEqual(row["resume_file"], "a.pdf")
+        self.assertEqual([r["email"] for r in self.journal.rows("job", PENDING)], ["b@example.com"])
+        self.assertEqual(self.journal.counts("job")[RENDERED], 1)
+
+    def test_fail_keeps_the_status_and_counts_attempts(self):
+        self.add("a@example.com")
+        self.journal.fail("job", "a@example.com", "boom")
+        self.journal.fail("job", "a@example.com", "boom again")
+        row = self.row("a@example.com")
+        self.assertEqual((row["status"], row["attempts"], row["error"]), (PENDING, 2, "boom again"))
+        self.assertEqual(self.journal.counts("job")["failed"], 1)
+        self.assertEqual(list(self.journal.rows("job", PENDING, max_attempts=2)), [])
+        self.assertEqual(len(list(self.journal.rows("job", PENDING, max_attempts=3))), 1)
+
+    def test_advancing_resets_attempts_for_the_next_stage(self):
+        self.add("a@example.com")
+        self.journal.fail("job", "a@example.com", "generate failed")
+        self.journal.fail("job", "a@example.com", "generate failed")
+        self.journal.advance("job", "a@example.com", GENERATED, subject="s", body="b")
+        row = self.row("a@example.com")
+        self.assertEqual((row["attempts"], row["error"]), (0, None))
+        self.journal.fail("job", "a@example.com", "render failed")
+        row = self.row("a@example.com")
+        self.assertEqual((row["status"], row["attempts"], row["error"]), (GENERATED, 1, "render failed"))
+        self.assertEqual(len(list(self.journal.rows("job", GENERATED, max_attempts=3))), 1)
+
+    def test_add_contacts_skips_known_emails(self):
+        self.add("a@example.com")
+        added = self.journal.add_contacts("job", [{"email": "a@example.com"}, {"email": "b@example.com"}])
+        self.assertEqual(added, 1)
+
+
+class RunSendTest(RunnerTestCase):
+    def test_sends_rendered_rows(self):
+        self.add("a@example.com", "b@example.com", status=RENDERED)
+        transport = FakeTransport()
+        sent = runner.run_send(self.journal, "job", transport, "pdfs", max_attempts=3)
+        self.assertEqual(sent, 2)
+        self.assertEqual(self.row("a@example.com")["status"], SENT)
+        self.assertEqual(self.row("a@example.com")["message_id"], "id-1")
+
+    def test_failed_sends_are_retried_up_to_max_attempts(self):
+        self.add("a@example.com", "b@example.com", status=RENDERED)
+        transport = FakeTransport({"a@example.com": ["down"] * 5, "b@example.com": ["down"]})
+        sent = runner.run_send(self.journal, "job", transport, "pdfs", max_attempts=3)
+        self.assertEqual(sent, 1)
+        self.assertEqual(transport.sent.count("a@example.com"), 3)
+        self.assertEqual(transport.sent.count("b@example.com"), 2)
+        row = self.row("a@example.com")
+        self.assertEqual((row["status"], row["attempts"], row["error"]), (RENDERED, 3, "down"))
+
+    def test_first_send_does_not_back_off_after_earlier_stage_failures(self):
+        self.add("a@example.com")
+        self.journal.fail("job", "a@example.com", "generate failed")
+        self.journal.advance("job", "a@example.com", GENERATED, subject="s", body="b")
+        self.journal.advance("job", "a@example.com", RENDERED, resume_file="r.pdf")
+        runner.run_send(self.journal, "job", FakeTransport(), "pdfs", max_attempts=3)
+        runner.jittered_delay.assert_not_called()
+
+    def test_max_attempts_below_one_is_rejected(self):
+        for max_attempts in (0, None, -1):
+            with self.assertRaises(ValueError):
+                runner.run_send(self.journal, "job", FakeTransport(), "pdfs", max_attempts=max_attempts)
+
+
+class RunJobTest(RunnerTestCase):
+    def setUp(self):
+        super().setUp()
+        # run_job keeps its render index under .cache and reads data/resume.json from the working directory
+        os.symlink(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data")),
+                   os.path.join(self.tmp, "data"))
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        self.addCleanup(os.chdir, cwd)
+
+    def run_job(self, transport, **kwargs):
+        with mock.patch.dict(mailmerge.TRANSPORTS, {"fake": lambda: transport}):
+            return runner.run_job(self.journal, "job", {"role": "Engineer"}, stages=("send",),
+                                  transport_name="fake", log=lambda message: None, **kwargs)
+
+    def test_unconfirmed_rows_are_left_alone_by_default(self):
+        self.add("a@example.com", status=RENDERED)
+        self.journal.advance_many("job", ["a@example.com"], SENDING)
+        transport = FakeTransport()
+        counts = self.run_job(transport)
+        self.assertEqual(transport.sent, [])
+        self.assertEqual(counts[SENDING], 1)
+
+    def test_resend_unconfirmed_sends_them_again(self):
+        self.add("a@example.com", "b@example.com", status=RENDERED)
+        self.journal.advance_many("job", ["a@example.com"], SENDING)
+        transport = FakeTransport()
+        counts = self.run_job(transport, resend_unconfirmed=True)
+        self.assertEqual(sorted(transport.sent), ["a@example.com", "b@example.com"])
+        self.assertEqual((counts[SENDING], counts[SENT]), (0, 2))
+
+    def test_max_attempts_below_one_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.run_job(FakeTransport(), max_attempts=0)
+
+    def test_cli_rejects_max_attempts_below_one(self):
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            runner.main(["--journal", os.path.join(self.tmp, "cli.sqlite"), "run", "--job", "job", "--max-attempts", "0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
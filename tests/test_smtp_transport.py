@@ -0,0 +1,66 @@
+import os
+import smtplib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import mailmerge  # noqa: E402
+from mailmerge import SmtpTransport  # noqa: E402
+
+
+class FakeSMTP:
+    def __init__(self):
+        self.sent = []
+
+    def sendmail(self, sender, recipients, data):
+        self.sent.append(data)
+
+    def close(self):
+        pass
+
+
+class SmtpTransportTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(mailmerge, "jittered_delay", return_value=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connect_error_is_retried_on_a_new_connection(self):
+        smtp = FakeSMTP()
+        transport = SmtpTransport(host="localhost", pool_size=1, max_retries=2)
+        with mock.patch.object(transport, "_connect",
+                               side_effect=[smtplib.SMTPConnectError(421, "try again later"), smtp]):
+            results = transport.send_all([{"to": "a@example.com", "subject": "s", "body": "b"}],
+                                         sender="me@example.com")
+        self.assertTrue(results[0]["ok"])
+        self.assertEqual(results[0]["attempts"], 2)
+        self.assertEqual(len(smtp.sent), 1)
+
+    def test_connect_errors_fail_the_message_not_the_run(self):
+        transport = SmtpTransport(host="localhost", pool_size=1, max_retries=1)
+        with mock.patch.object(transport, "_connect", side_effect=smtplib.SMTPConnectError(421, "busy")):
+            results = transport.send_all([{"to": "a@example.com", "subject": "s", "body": "b"},
+                                          {"to": "b@example.com", "subject": "s", "body": "b"}],
+                                         sender="me@example.com")
+        self.assertEqual([r["ok"] for r in results], [False, False])
+        self.assertIn("busy", results[0]["error"])
+
+    def test_messages_use_crlf_line_endings(self):
+        smtp = FakeSMTP()
+        transport = SmtpTransport(host="localhost", pool_size=1)
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as attachment:
+            attachment.write(b"%PDF-1.4\n" * 200)
+            attachment.flush()
+            with mock.patch.object(transport, "_connect", return_value=smtp):
+                transport.send_all([{"to": "a@example.com", "subject": "s", "body": "line one\nline two",
+                                     "attachments": [attachment.name]}], sender="me@example.com")
+        data = smtp.sent[0]
+        self.assertIn(b"\r\n", data)
+        self.assertNotIn(b"\n", data.replace(b"\r\n", b""))
+
+
+if __name__ == "__main__":
+    unittest.main()